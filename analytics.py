@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from bp_rules import RULES, classify_batch
+
+DAY_SECONDS = 86400
+# Categories that count towards "2 or more consecutive readings in the high range"
+ELEVATED_CATEGORIES = ('high', 'severe')
+STATUSES = (False, True)  # on_treatment
+
+
+# numpy array that grows by doubling, so appends are amortized O(1)
+class GrowableArray:
+    def __init__(self, dtype, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = self.size + len(values)
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = values
+        self.size = needed
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+
+def _parse_timestamps(values):
+    try:
+        return np.array(values, dtype='datetime64[s]').astype(np.int64)
+    except ValueError:
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(np.datetime64(value, 's').astype(np.int64))
+            except ValueError:
+                parsed.append(-1)
+        return np.array(parsed, dtype=np.int64)
+
+
+def _parse_numbers(values):
+    try:
+        return np.array(values).astype(np.int64)
+    except (TypeError, ValueError):
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(int(value))
+            except (TypeError, ValueError):
+                parsed.append(-1)
+        return np.array(parsed, dtype=np.int64)
+
+
+# Mean of each reading and the up to `window - 1` readings before it
+def rolling_mean(values, window):
+    sums = np.concatenate(([0], np.cumsum(values, dtype=np.float64)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+
+# Columnar copy of every BP reading (Logs sheet rows) for trend analytics.
+#
+# `read_since(cursor)` returns (cursor, rows, reset) with the rows added
+# after `cursor`; LogsReadCache.rows_since and BPLogStore.rows_since both
+# fit. Only new rows are parsed and classified (under both treatment
+# statuses) and appended to the arrays; `reset` means the source was
+# reloaded or compacted and the arrays are rebuilt. Query results are
+# cached until new readings arrive or `result_ttl` seconds pass, since the
+# "last N days" window moves with the clock.
+class ReadingsAnalytics:
+    def __init__(self, read_since, rules=RULES, result_ttl=60.0, max_results=256):
+        self.read_since = read_since
+        self.rules = rules
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.categories = {
+            status: [category for category, _, _, _ in rules['on_treatment' if status else 'not_on_treatment']]
+            for status in STATUSES
+        }
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self.version = 0  # bumped whenever readings change; cached results carry the version they saw
+        self._reset()
+        self._cursor = None
+
+    def _reset(self):
+        self._codes = {}  # MAC address -> code
+        self._patient = GrowableArray(np.int32)
+        self._timestamp = GrowableArray(np.int64)
+        self._systolic = GrowableArray(np.int32)
+        self._diastolic = GrowableArray(np.int32)
+        self._category = {status: GrowableArray(np.int8) for status in STATUSES}
+        self._order = None
+        self.version += 1
+
+    def _ingest(self, rows):
+        rows = [row for row in rows if len(row) >= 5]
+        if not rows:
+            return
+        timestamps = _parse_timestamps([row[0] for row in rows])
+        systolic = _parse_numbers([row[3] for row in rows])
+        diastolic = _parse_numbers([row[4] for row in rows])
+        valid = (timestamps >= 0) & (systolic > 0) & (diastolic > 0)
+        patients = np.array([self._codes.setdefault(row[2], len(self._codes)) for row in rows], dtype=np.int32)
+        self._patient.extend(patients[valid])
+        self._timestamp.extend(timestamps[valid])
+        self._systolic.extend(systolic[valid])
+        self._diastolic.extend(diastolic[valid])
+        for status in STATUSES:
+            names = classify_batch(systolic[valid], diastolic[valid], status, self.rules)
+            codes = np.zeros(len(names), dtype=np.int8)
+            for code, category in enumerate(self.categories[status]):
+                codes[names == category] = code
+            self._category[status].extend(codes)
+        self._order = None
+        self.version += 1
+
+    def sync(self):
+        with self._lock:
+            cursor, rows, reset = self.read_since(self._cursor)
+            if reset:
+                self._reset()
+            self._cursor = cursor
+            self._ingest(rows)
+
+    # Readings grouped by patient and ordered by time within each patient
+    def _sorted(self):
+        if self._order is None:
+            self._order = np.lexsort((self._timestamp.values, self._patient.values))
+        return self._order
+
+    def _cached(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._results.get(key)
+            if entry and entry[0] == self.version and now - entry[1] < self.result_ttl:
+                self._results.move_to_end(key)
+                return entry[2]
+            result = compute()
+            self._results[key] = (self.version, now, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+            return result
+
+    def _columns(self, order, on_treatment):
+        return (self._patient.values[order], self._timestamp.values[order], self._systolic.values[order],
+                self._diastolic.values[order], self._category[on_treatment].values[order])
+
+    def _elevated_codes(self, on_treatment):
+        return [code for code, category in enumerate(self.categories[on_treatment])
+                if category in ELEVATED_CATEGORIES]
+
+    @staticmethod
+    def _since(days):
+        now = int(np.datetime64(datetime.now().replace(microsecond=0), 's').astype(np.int64))
+        return now - days * DAY_SECONDS
+
+    @staticmethod
+    def _format(timestamps):
+        # Same 'YYYY-MM-DD HH:MM:SS' format as the stored timestamps
+        if not len(timestamps):
+            return []
+        return np.char.replace(np.datetime_as_string(timestamps.astype('datetime64[s]')), 'T', ' ').tolist()
+
+    def _counts(self, codes, on_treatment):
+        counts = np.bincount(codes, minlength=len(self.categories[on_treatment]))
+        return dict(zip(self.categories[on_treatment], counts.tolist()))
+
+    # Trend for one patient over the last `days` days: per-category counts,
+    # rolling means over `window` readings and consecutive elevated readings
+    def patient_trend(self, mac_address, days=30, window=3, on_treatment=False):
+        self.sync()
+        return self._cached(('patient', mac_address, days, window, on_treatment),
+                            lambda: self._patient_trend(mac_address, days, window, on_treatment))
+
+    def _patient_trend(self, mac_address, days, window, on_treatment):
+        code = self._codes.get(mac_address)
+        order = self._sorted()
+        if code is None:
+            order = order[:0]
+        else:
+            patients = self._patient.values[order]
+            order = order[np.searchsorted(patients, code, 'left'):np.searchsorted(patients, code, 'right')]
+        _, timestamps, systolic, diastolic, categories = self._columns(order, on_treatment)
+        recent = timestamps >= self._since(days)
+        timestamps, systolic, diastolic, categories = (
+            timestamps[recent], systolic[recent], diastolic[recent], categories[recent])
+
+        elevated = np.isin(categories, self._elevated_codes(on_treatment))
+        repeated = elevated[1:] & elevated[:-1]
+        latest = None
+        if len(timestamps):
+            latest = {'timestamp': self._format(timestamps[-1:])[0], 'systolic': int(systolic[-1]),
+                      'diastolic': int(diastolic[-1]),
+                      'category': self.categories[on_treatment][categories[-1]]}
+        return {
+            'mac_address': mac_address,
+            'on_treatment': on_treatment,
+            'days': days,
+            'readings': int(len(timestamps)),
+            'latest': latest,
+            'categories': self._counts(categories, on_treatment),
+            'mean': {'systolic': round(float(systolic.mean()), 1) if len(systolic) else None,
+                     'diastolic': round(float(diastolic.mean()), 1) if len(diastolic) else None},
+            'rolling': {
+                'window': window,
+                'timestamps': self._format(timestamps),
+                'systolic': np.round(rolling_mean(systolic, window), 1).tolist(),
+                'diastolic': np.round(rolling_mean(diastolic, window), 1).tolist(),
+            },
+            # Second reading of each elevated pair, i.e. when repeat-reading guidance applies
+            'consecutive_elevated': self._format(timestamps[1:][repeated]),
+            'consecutive_elevated_now': bool(len(repeated) and repeated[-1]),
+        }
+
+    # Summary across all patients with readings in the last `days` days
+    # Counts only: the cohort view never names a patient
+    def cohort_summary(self, days=30, on_treatment=False):
+        self.sync()
+        return self._cached(('cohort', days, on_treatment),
+                            lambda: self._cohort_summary(days, on_treatment))
+
+    def _cohort_summary(self, days, on_treatment):
+        patients, timestamps, systolic, diastolic, categories = self._columns(self._sorted(), on_treatment)
+        recent = timestamps >= self._since(days)
+        patients, systolic, diastolic, categories = (
+            patients[recent], systolic[recent], diastolic[recent], categories[recent])
+
+        # Last reading of each patient, and elevated readings that follow an elevated one
+        last = np.flatnonzero(np.append(patients[1:] != patients[:-1], True)) if len(patients) else patients
+        elevated = np.isin(categories, self._elevated_codes(on_treatment))
+        repeated = elevated[1:] & elevated[:-1] & (patients[1:] == patients[:-1])
+        flagged = np.unique(patients[1:][repeated])
+        # A patient is flagged "now" when their two latest readings are both elevated
+        latest_pair = last[last > 0]
+        current = latest_pair[repeated[latest_pair - 1]]
+        return {
+            'on_treatment': on_treatment,
+            'days': days,
+            'patients': int(len(last)),
+            'readings': int(len(patients)),
+            'categories': self._counts(categories, on_treatment),
+            'latest_categories': self._counts(categories[last], on_treatment),
+            'mean': {'systolic': round(float(systolic.mean()), 1) if len(systolic) else None,
+                     'diastolic': round(float(diastolic.mean()), 1) if len(diastolic) else None},
+            'consecutive_elevated_patients': int(len(flagged)),
+            'consecutive_elevated_now': int(len(current)),
+        }
@@ -1,212 +1,206 @@
 import os
 import json
 from datetime import datetime
+import time
 import uuid
-from flask import Flask, render_template, request, jsonify
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from langchain.chains import LLMChain
-from langchain_core.prompts import (
-    ChatPromptTemplate,
-    HumanMessagePromptTemplate,
-    MessagesPlaceholder,
-)
-from langchain_core.messages import SystemMessage
-from langchain.chains.conversation.memory import ConversationBufferWindowMemory
-from langchain_groq import ChatGroq
+from functools import partial
+from flask import Flask, Blueprint, render_template, request, jsonify, g, Response, stream_with_context
 import markdown
 from dotenv import load_dotenv
+from clients import get_sheets_service, get_groq_chat, model, groq_limiter, sheets_pool
+from lazy import lazy
+from limits import UpstreamBusy
+from session_memory import create_session_store
+from history_budget import MESSAGE_OVERHEAD, count_tokens, truncate_to_tokens
+from prompts import intake_prompt, intake_system_prompt
+from sheets_writer import SheetsWriteBehind
+from sheets_cache import LogsReadCache
+from log_queries import TRUE_VALUES, parse_log_query, parse_analytics_query, page_rows, rows_to_objects, rows_to_columns, encode_json
+from bp_store import BPLogStore
+from analytics import ReadingsAnalytics
+from bulk_ingest import read_records, ingest, parse_flag
+from response_cache import ResponseCache
+from bp_rules import extract_readings
+from intake import IntakeFlow
+from assets import AssetManifest, send_asset
+from metrics import REGISTRY, CONTENT_TYPE, RequestProfiler, span, request_seconds, responses_total, bulk_rows_total
 
 load_dotenv()
 
-# CREDENTIALS_FILE = 'plenary-caster-412619-3b8e91b60470.json'
-credentials_info = {
-    "type": os.getenv("GOOGLE_TYPE"),
-    "project_id": os.getenv("GOOGLE_PROJECT_ID"),
-    "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID"),
-    "private_key": os.getenv("GOOGLE_PRIVATE_KEY").replace("\\n", "\n"),
-    "client_email": os.getenv("GOOGLE_CLIENT_EMAIL"),
-    "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-    "auth_uri": os.getenv("GOOGLE_AUTH_URI"),
-    "token_uri": os.getenv("GOOGLE_TOKEN_URI"),
-    "auth_provider_x509_cert_url": os.getenv("GOOGLE_AUTH_PROVIDER_X509_CERT_URL"),
-    "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL"),
-    "universe_domain": os.getenv("GOOGLE_UNIVERSE_DOMAIN"),
-}
-credentials = Credentials.from_service_account_info(credentials_info)
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-SERVICE = build('sheets', 'v4', credentials=credentials)
 spreadsheet_id = os.getenv("FORM")
 sheet_name = 'Logs'  # Name of the sheet where BP logs are stored
 def retrieve_data(spreadsheet_id, range_name):
-    result = SERVICE.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=range_name).execute()
+    with span('sheets_read'), sheets_pool.connection() as http:
+        result = get_sheets_service().spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=range_name).execute(http=http)
     return result.get('values', [])
 
 def append_data(spreadsheet_id, range_name, values):
     body = {'values': values}
-    result = SERVICE.spreadsheets().values().append(
-        spreadsheetId=spreadsheet_id,
-        range=range_name,
-        valueInputOption='RAW',
-        body=body
-    ).execute()
+    with span('sheets_append'), sheets_pool.connection() as http:
+        result = get_sheets_service().spreadsheets().values().append(
+            spreadsheetId=spreadsheet_id,
+            range=range_name,
+            valueInputOption='RAW',
+            body=body
+        ).execute(http=http)
     return result
 
-def find_next_available_row(spreadsheet_id, sheet_name):
-    range_name = f'{sheet_name}!A:A'
-    data = retrieve_data(spreadsheet_id, range_name)
-    return len(data) + 1
-
-def filter_data_by_mac(data, mac_address):
-    header = data[0]
-    filtered_rows = [header]
-    for row in data[1:]:
-        if len(row) > 2 and row[2] == mac_address:
-            filtered_rows.append(row)
-    return filtered_rows
-app = Flask(__name__)
-# Get Groq API key
-groq_api_key = os.getenv("GROQ_API")
-
-model = 'llama3-8b-8192'
-
-# Initialize Groq Langchain chat object and conversation
-groq_chat = ChatGroq(
-        groq_api_key=groq_api_key, 
-        model_name=model
-)
-
-# with open('steps.json', 'r') as file:
-#     assessment_data = json.load(file)
-system_prompt = '''
-**Role Description:**
-
-You are a helpful AI assistant guiding users through a hypertension assessment. Strickly follow the below guidelines:
-
-1. **Information Gathering:**
-   - Collect the following details one at a time:
-     - Name
-     - Age
-     - Gender
-     - Anti-hypertensive medication status (e.g., "Are you currently taking any blood pressure medication?")
-     - Most recent blood pressure reading
-
-2. **Essential Information for Assessment:**
-   - Systolic and diastolic blood pressure readings.
-   - Medication status (on treatment or not).
-
-3. **Response Guidelines:** 
-   - Provide responses that are informative yet concise, aiming to keep them under 500 characters.
-   - Ask only one question at a time. 
-   - Do not assume any information that the user has not provided in the chat memory.
-
-4. **Blood Pressure Reading Format:** 
-   - Require users to provide blood pressure readings in the format 'SYS/DIA' (e.g., '120/80').
-   - Avoid asking for systolic and diastolic readings separately.
-
-5. **Question Clarity:** 
-   - Ensure every question is straightforward and free from ambiguity.
-
-6. **Evaluation Criteria:**
-   - **On Treatment:**
-     - **Severe:** SYS ≥ 160 or DIA ≥ 110
-     - **High:** 150 ≤ SYS ≤ 159 or 100 ≤ DIA ≤ 109
-     - **Raised:** 140 ≤ SYS ≤ 149 or 90 ≤ DIA ≤ 99
-     - **High Normal:** 130 ≤ SYS ≤ 139 or 80 ≤ DIA ≤ 89
-     - **Low Normal:** 100 ≤ SYS ≤ 129 and DIA < 80
-     - **Low:** SYS < 100 and DIA < 80
-   - **Not On Treatment:**
-     - **Severe:** SYS ≥ 160 or DIA ≥ 110
-     - **High:** 140 ≤ SYS ≤ 159 or 90 ≤ DIA ≤ 109
-     - **Normal:** SYS < 140 and DIA < 90
-
-7. **Evaluation and Guidance:**
-   - **If On Treatment:**
-     - **Severe:** "Your blood pressure is very high. Sit quietly for 5 minutes and repeat the reading. If it remains high, contact your local hospital's maternity unit immediately."
-     - **High:** "Your blood pressure is high. Sit quietly for 5 minutes and repeat the reading. If it remains high, contact your provider urgently."
-     - **Raised:** "Your blood pressure is raised. No change in medication is needed at this time."
-     - **High Normal:** "Your blood pressure is in the target range when on treatment. This is fine if you have no side effects."
-     - **Low Normal:** "Your blood pressure is normal, but you may need less treatment. Follow your medication change instructions if this persists for 2 days."
-     - **Low:** " Your blood pressure is too low. Sit quietly for 5 minutes and repeat the reading. If it remains low, contact your provider urgently."
-   - **If Not On Treatment:**
-     - **Severe:** "Your blood pressure is very high. Sit quietly for 5 minutes and repeat the reading. If it remains high, contact your local hospital's maternity unit for urgent assessment."
-     - **High:** "Your blood pressure is high. Sit quietly for 5 minutes and repeat the reading. If 2 or more consecutive readings are high, contact your provider or local hospital’s maternity unit within 48 hours."
-     - **Normal:** "Your blood pressure is normal."
-
-8. **Adherence:**
-   - Ensure all responses strictly align with the evaluation criteria and guidance provided.
-'''
-# Blood pressure evaluation rules
-evaluation_rules = {
-    "on_treatment": {
-        "severe": "If SYS is 160 or more, or DIA is 110 or more, or if severe symptoms are present, respond with: "
-                  "'Your blood pressure is very high. Sit quietly for 5 minutes and repeat the blood pressure reading. "
-                  "If this is a repeat reading in the severe range, contact your local hospital’s maternity unit "
-                  "immediately and go in for an urgent assessment today at the local hospital.'",
-        "high": "If SYS is 150-159 or DIA is 100-109, respond with: "
-                "'Your blood pressure is high. Sit quietly for 5 minutes and repeat the blood pressure reading. "
-                "If this is a repeat reading in the high range, contact your provider urgently and arrange assessment today.'",
-        "raised": "If SYS is 140-149 or DIA is 90-99, respond with: "
-                  "'Your blood pressure is raised. No change in your medication yet.'",
-        "high_normal": "If SYS is 130-139 or DIA is 80-89, respond with: "
-                       "'Your blood pressure is in the target range when on treatment. This is fine provided that you "
-                       "have no side effects.'",
-        "low_normal": "If SYS is 100-129 and DIA is less than 80, respond with: "
-                      "'Your blood pressure is normal but you may require less treatment. Follow your medication change "
-                      "instructions if your blood pressure remains in this range for 2 days in a row.'",
-        "low": "If SYS is less than 100 and DIA is less than 80, respond with: "
-               "'Your blood pressure is too low. Sit quietly for 5 minutes and repeat the blood pressure reading. "
-               "If this is a repeat reading in the low range, contact your provider urgently and arrange assessment today.'"
-    },
-    "not_on_treatment": {
-        "severe": "If SYS is 160 or more or DIA is 110 or more, respond with: "
-                  "'Your blood pressure is very high. Sit quietly for 5 minutes and repeat the blood pressure reading. "
-                  "If this is a repeat reading in the severe range, immediately contact your local hospital’s maternity "
-                  "unit for urgent assessment today at the hospital.'",
-        "high": "If SYS is 140-159 or DIA is 90-109, respond with: "
-                "'Your blood pressure is high. Sit quietly for 5 minutes and repeat the blood pressure reading. "
-                "If 2 or more consecutive readings are in this high range, contact your provider or local hospital’s "
-                "maternity assessment unit for review within 48 hours.'",
-        "normal": "If SYS is less than 140 and DIA is less than 90, respond with: "
-                  "'Your blood pressure is normal.'"
-    }
-}
+# Sheets' append already finds the end of the table, so no column scan is needed
+def append_log_rows(rows):
+    return append_data(spreadsheet_id, f'{sheet_name}!A:E', rows)
 
-# Get system prompt from JSON
-# system_prompt = assessment_data['system_prompt']
-conversational_memory_length = 20  # number of previous messages the chatbot will remember during the conversation and
-memory = ConversationBufferWindowMemory(k=conversational_memory_length, memory_key="chat_history", return_messages=True)
-memory.clear()
+# Local copy of the Logs sheet indexed by MAC address; only new rows are fetched on refresh
+logs_cache = LogsReadCache(lambda range_name: retrieve_data(spreadsheet_id, range_name), sheet_name,
+                           ttl=float(os.getenv("LOGS_CACHE_TTL", 30)))
 
-UPLOAD_DIR = 'uploads'
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-BP_LOGS_FILE = 'bp_logs.json'
+# BP readings are written to the Logs sheet in the background, in batches
+@lazy
+def get_sheets_writer():
+    return SheetsWriteBehind(append_log_rows, os.getenv("SHEETS_SPOOL_DIR", "spool"),
+                             on_flush=lambda rows: logs_cache.invalidate())
 
-# Initialize or load BP logs from the JSON file
-def load_bp_logs():
-    if os.path.exists(BP_LOGS_FILE):
-        with open(BP_LOGS_FILE, 'r') as file:
-            return json.load(file)
-    return {}
+bp = Blueprint('bp_pal', __name__)
 
-# Save BP logs to JSON file
-def save_bp_logs(logs):
-    with open(BP_LOGS_FILE, 'w') as file:
-        json.dump(logs, file)
+# The prompt piped into the model, built once on first use; each session's history is passed in per call.
+# /chat invokes it and /chat/stream streams from it.
+@lazy
+def get_chain():
+    return intake_prompt | get_groq_chat()
+
+# Answers to repeated scripted turns are reused instead of calling Groq again
+response_cache = ResponseCache(int(os.getenv("RESPONSE_CACHE_SIZE", 1024)),
+                               int(os.getenv("RESPONSE_CACHE_HISTORY", 2)))
+# Intake questions come from steps.json; the LLM only sees a slot summary and the
+# latest messages, within the session memory's token budget (PROMPT_TOKEN_BUDGET)
+intake_flow = IntakeFlow.from_file()
+STREAM_RENDER_CHARS = 40  # re-render streamed markdown at least every this many new characters
+
+conversational_memory_length = 20  # number of previous messages the chatbot will remember during the conversation and
+# Each chat session gets its own token-budgeted memory instead of one shared window
+session_store = create_session_store(conversational_memory_length)
+SESSION_COOKIE = 'bp_session'
+SESSION_HEADER = 'X-Session-Id'
+# Secure flag on the session cookie: 'auto' follows the scheme the browser used, 'true'/'false' force it
+SESSION_COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "auto").lower()
+
+UPLOAD_DIR = 'uploads'
+BP_LOGS_FILE = 'bp_logs.json'  # legacy whole-file store, migrated on first start
+# Append-only local store; the source of truth while Sheets syncs in the background
+bp_store = BPLogStore(os.getenv("BP_LOG_STORE", "bp_logs.jsonl"), legacy_path=BP_LOGS_FILE)
+# Where /get-bp-logs reads from: 'sheets' (cached Logs sheet) or 'local' (bp_store)
+BP_LOGS_SOURCE = os.getenv("BP_LOGS_SOURCE", "sheets")
+# Trend analytics over every reading from the same source, kept as numpy columns and updated with new rows only
+analytics = ReadingsAnalytics(bp_store.rows_since if BP_LOGS_SOURCE == 'local' else logs_cache.rows_since,
+                              result_ttl=float(os.getenv("ANALYTICS_RESULT_TTL", 60)))
+
+# Upload formats accepted by /bp-logs/bulk, by Content-Type
+BULK_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json-lines': 'jsonl',
+}
+# Until requests are authenticated, analytics and uploads only ever use this device's readings
+PATIENT_NOT_SUPPORTED = "patient is not supported; readings are limited to this device"
+
+# Sampled profiling: every PROFILE_EVERY-th request is run under cProfile and dumped to PROFILE_DIR (0 = off)
+profiler = RequestProfiler(int(os.getenv("PROFILE_EVERY", 0)), os.getenv("PROFILE_DIR", "profiles"))
+
+# Numbers owned by the caches, the Sheets writer and the upstream limiters, read on each /metrics scrape
+REGISTRY.collected('bp_pal_cache_hits_total', 'Lookups answered from a cache.', 'counter',
+                   lambda: {'response': response_cache.hits, 'logs': logs_cache.hits}, label='cache')
+REGISTRY.collected('bp_pal_cache_misses_total', 'Lookups that missed a cache.', 'counter',
+                   lambda: {'response': response_cache.misses, 'logs': logs_cache.misses}, label='cache')
+REGISTRY.collected('bp_pal_response_cache_entries', 'Answers held in the response cache.', 'gauge',
+                   lambda: response_cache.stats()['size'])
+REGISTRY.collected('bp_pal_logs_cache_rows_fetched_total', 'Logs sheet rows pulled into the read cache.', 'counter',
+                   lambda: logs_cache.rows_fetched)
+REGISTRY.collected('bp_pal_upstream_in_flight', 'Calls currently running against an upstream.', 'gauge',
+                   lambda: {groq_limiter.name: groq_limiter.in_flight, sheets_pool.name: sheets_pool.in_flight},
+                   label='upstream')
+REGISTRY.collected('bp_pal_upstream_rejected_total', 'Calls refused because an upstream was at its limit.', 'counter',
+                   lambda: {groq_limiter.name: groq_limiter.rejected, sheets_pool.name: sheets_pool.rejected},
+                   label='upstream')
+REGISTRY.collected('bp_pal_sheets_pending_rows', 'BP log rows waiting to be written to Google Sheets.', 'gauge',
+                   lambda: get_sheets_writer().pending())
+REGISTRY.collected('bp_pal_sheets_rows_written_total', 'BP log rows written to Google Sheets.', 'counter',
+                   lambda: get_sheets_writer().rows_written)
+REGISTRY.collected('bp_pal_sheets_failed_batches_total', 'Sheets append batches that failed and were retried.',
+                   'counter', lambda: get_sheets_writer().failed_batches)
 
 # Function to add a BP log
-def add_bp_log(mac_address, systolic, diastolic):
-    logs = load_bp_logs()
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    if mac_address not in logs:
-        logs[mac_address] = []
-    logs[mac_address].append({"systolic": systolic, "diastolic": diastolic, "timestamp": timestamp})
-    save_bp_logs(logs)
+def add_bp_log(mac_address, systolic, diastolic, timestamp=None, email=None):
+    bp_store.append(mac_address, systolic, diastolic, timestamp=timestamp, email=email)
 
 # Function to retrieve BP logs for a MAC address
 def get_bp_logs(mac_address):
-    logs = load_bp_logs()
-    return logs.get(mac_address, [])
+    return bp_store.get(mac_address)
+
+# Function to get the chat session id from the header or cookie, minting a new one if needed
+def get_session_id():
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not session_id or len(session_id) > 64 or not session_id.replace('-', '').isalnum():
+        session_id = uuid.uuid4().hex
+        g.new_session_id = session_id
+    return session_id
+
+# Function to advance the intake state machine; None means the LLM has to answer
+def intake_answer(session, user_question):
+    state = session.context.setdefault('intake', intake_flow.new_state())
+    return intake_flow.handle(state, user_question)
+
+# Function to build the compact LLM inputs for a turn the state machine could not answer.
+# The history is whatever fits the session's token budget next to the system prompt and question.
+def llm_inputs(session, user_question):
+    state = session.context['intake']
+    _, next_question = intake_flow.next_question(state)
+    next_question = next_question or "Would you like to share a new blood pressure reading (SYS/DIA)?"
+    slot_summary = intake_flow.summary(state)
+    budget = session.memory.budget
+    system_tokens = count_tokens(intake_system_prompt.format(next_question=next_question, slot_summary=slot_summary))
+    # An oversized message is cut so the prompt still fits the budget
+    human_input = truncate_to_tokens(user_question, max(budget - system_tokens - 2 * MESSAGE_OVERHEAD, 0))
+    fixed_tokens = system_tokens + count_tokens(human_input) + 2 * MESSAGE_OVERHEAD
+    return {
+        "human_input": human_input,
+        "chat_history": session.memory.prompt_history(fixed_tokens),
+        "slot_summary": slot_summary,
+        "next_question": next_question,
+    }
+
+# Function to look up a cached LLM answer; turns containing BP readings always bypass the cache
+def cached_answer(inputs, readings):
+    if readings:
+        return None, None
+    context = f"{inputs['slot_summary']}\n{inputs['next_question']}"
+    cache_key = response_cache.key(inputs['human_input'], inputs['chat_history'], model, context)
+    return cache_key, response_cache.get(cache_key)
+
+# Function to store a turn in the session and log any readings it contained.
+# A turn with no answer (e.g. Groq was busy) only saves the intake state and readings.
+def record_turn(session, user_question, response, readings):
+    if response:
+        session.memory.chat_memory.add_user_message(user_question)
+        session.memory.chat_memory.add_ai_message(response)
+    session_store.save(session)
+    if readings:
+        email = "testing.xyz"
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        mac_address = get_mac_address()
+        values_to_write = [[timestamp, email, mac_address, systolic, diastolic] for systolic, diastolic in readings]
+        # Sheets first, as in /bp-logs/bulk, so the local store never holds a reading Sheets will not get.
+        # A patient's reading is never dropped: past a full queue it is taken anyway.
+        get_sheets_writer().enqueue(values_to_write, overflow=True)
+        bp_store.append_many([
+            {'timestamp': timestamp, 'email': email, 'mac_address': mac_address,
+             'systolic': systolic, 'diastolic': diastolic}
+            for systolic, diastolic in readings
+        ])
+
+# Function to format one server-sent event
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 # Function to get MAC address of the user's machine
 def get_mac_address():
@@ -214,85 +208,273 @@ def get_mac_address():
     return ':'.join(mac_num[i:i+2] for i in range(0, len(mac_num), 2))
 
 
-@app.before_request
+# Route template (e.g. /chat) used as the metrics label, so paths with ids do not explode the series count
+def route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@bp.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.profile = profiler.start()
+
+@bp.before_app_request
 def clear_cache():
-    if request.path == '/chat':
+    if request.path in ('/chat', '/chat/stream'):
+        # Remember the real scheme; the override below would make every cookie Secure
+        g.client_scheme = request.scheme
         request.environ['wsgi.url_scheme'] = 'https'
         request.environ['HTTP_CACHE_CONTROL'] = 'no-cache'
         request.environ['HTTP_PRAGMA'] = 'no-cache'
         request.environ['HTTP_EXPIRES'] = '0'
-@app.route('/')
+
+# Record the request's latency and write its profile, if it was sampled
+def finish_request_metrics(route, method, started, profile):
+    if started is not None:
+        request_seconds.observe(time.perf_counter() - started, route=route, method=method)
+    if profile is not None:
+        print("Profile written to", profiler.stop(profile, f"{method}-{route}"))
+
+@bp.after_app_request
+def count_response(response):
+    route = route_label()
+    responses_total.inc(route=route, method=request.method, status=response.status_code)
+    # Finish once the body has been sent, so /chat/stream is timed until its last event
+    response.call_on_close(partial(finish_request_metrics, route, request.method,
+                                   g.pop('request_started', None), g.pop('profile', None)))
+    return response
+
+# after_request hooks are skipped when an exception propagates, so never leave a profiler running
+@bp.teardown_app_request
+def finish_failed_request(error=None):
+    if 'request_started' in g:
+        finish_request_metrics(route_label(), request.method, g.pop('request_started'), g.pop('profile', None))
+
+# Function to tell whether the browser reached us over https, directly or through a TLS-terminating proxy
+def client_is_secure():
+    if SESSION_COOKIE_SECURE != 'auto':
+        return SESSION_COOKIE_SECURE in TRUE_VALUES
+    forwarded = request.headers.get('X-Forwarded-Proto', '').split(',')[0].strip().lower()
+    return forwarded == 'https' or g.get('client_scheme', request.scheme) == 'https'
+
+@bp.after_app_request
+def set_session_cookie(response):
+    new_session_id = g.pop('new_session_id', None)
+    if new_session_id:
+        response.set_cookie(SESSION_COOKIE, new_session_id, httponly=True, samesite='Lax', secure=client_is_secure())
+    return response
+@bp.app_errorhandler(UpstreamBusy)
+def upstream_busy(error):
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+# Bundled, fingerprinted static files from `python assets.py build`
+asset_manifest = AssetManifest()
+
+@bp.app_context_processor
+def inject_assets():
+    return {'asset_url': asset_manifest.url, 'stylesheets': asset_manifest.stylesheets,
+            'scripts': asset_manifest.scripts, 'picture': asset_manifest.picture}
+
+@bp.route('/assets/<path:filename>')
+def assets(filename):
+    return send_asset(filename, request.accept_encodings)
+
+@bp.route('/')
 def home():
     return render_template('home.html')
 
-@app.route('/index')
+@bp.route('/index')
 def index():
     return render_template('index.html')
 
-@app.route('/chat', methods=['POST'])
+@bp.route('/chat', methods=['POST'])
 def chat():
     user_question = request.json.get('question')
     
     if user_question:
-        # Construct a chat prompt template using various components
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessage(content=f"{system_prompt}"),
-                MessagesPlaceholder(variable_name="chat_history"),
-                HumanMessagePromptTemplate.from_template("{human_input}")
-            ]
-        )
-
-        # Create a conversation chain
-        conversation = LLMChain(
-            llm=groq_chat,
-            prompt=prompt,
-            verbose=False,
-            memory=memory,
-        )
-
-        response = conversation.predict(human_input=user_question)
-        response_markdown = markdown.markdown(response)
-        if "bp" in user_question.lower() or "blood pressure" in user_question.lower() or "/" in user_question:
-            parts = user_question.lower().split()
-            for part in parts:
-                if '/' in part:
-                    try:
-                        email = "testing.xyz"
-                        systolic, diastolic = map(int, part.split('/'))
-                        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        mac_address = get_mac_address()
-                        values_to_write = [[timestamp, email, mac_address, systolic, diastolic]]
-                        next_row = find_next_available_row(spreadsheet_id, sheet_name)
-                        append_range = f'{sheet_name}!A{next_row}'
-                        append_result = append_data(spreadsheet_id, append_range, values_to_write)
-                        print("Append result:", append_result)
-                    except ValueError:
-                        pass
+        with span('session_load'):
+            session = session_store.load(get_session_id())
+        readings = extract_readings(user_question)
+
+        with span('intake'):
+            response = intake_answer(session, user_question)
+        if response is None:
+            with span('prompt_build'):
+                inputs = llm_inputs(session, user_question)
+                cache_key, response = cached_answer(inputs, readings)
+            if response is None:
+                with span('llm'), groq_limiter.slot():
+                    response = get_chain().invoke(inputs).content
+                if cache_key:
+                    response_cache.put(cache_key, response)
+        with span('markdown'):
+            response_markdown = markdown.markdown(response)
+        with span('record_turn'):
+            record_turn(session, user_question, response, readings)
         # Return the formatted response
         return jsonify({"answer": response_markdown})
         # return jsonify({"answer": response})
 
     return jsonify({"answer": "Sorry, I didn't understand that."})
 
-@app.route('/get-bp-logs', methods=['GET'])
+@bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    user_question = request.json.get('question')
+    if not user_question:
+        return Response(sse_event({"html": "Sorry, I didn't understand that."}, event="done"),
+                        mimetype='text/event-stream')
+
+    with span('session_load'):
+        session = session_store.load(get_session_id())
+    readings = extract_readings(user_question)
+
+    def generate():
+        with span('intake'):
+            response = intake_answer(session, user_question)
+        if response is None:
+            with span('prompt_build'):
+                inputs = llm_inputs(session, user_question)
+                cache_key, response = cached_answer(inputs, readings)
+        if response is not None:
+            # Saved before the last event, so a client that disconnects now still keeps its turn
+            with span('record_turn'):
+                record_turn(session, user_question, response, readings)
+            with span('markdown'):
+                html = markdown.markdown(response)
+            yield sse_event({"html": html}, event="done")
+            return
+
+        response = ''
+        rendered_length = 0
+        try:
+            with span('llm_stream'), groq_limiter.slot():
+                stream = get_chain().stream(inputs)
+                try:
+                    for chunk in stream:
+                        if not chunk.content:
+                            continue
+                        response += chunk.content
+                        # Re-render on line breaks or every few words so partial markdown stays readable
+                        if '\n' in chunk.content or len(response) - rendered_length >= STREAM_RENDER_CHARS:
+                            rendered_length = len(response)
+                            with span('markdown'):
+                                html = markdown.markdown(response)
+                            yield sse_event({"html": html})
+                finally:
+                    # Runs on client disconnect too (GeneratorExit), which cancels the Groq stream
+                    stream.close()
+            if cache_key:
+                response_cache.put(cache_key, response)
+        except UpstreamBusy as error:
+            yield sse_event({"html": str(error), "retry_after": error.retry_after}, event="done")
+            return
+        finally:
+            # Also on disconnects and upstream errors: the intake state and any readings are never lost,
+            # and whatever part of the answer was sent is kept in the history
+            with span('record_turn'):
+                record_turn(session, user_question, response, readings)
+        with span('markdown'):
+            html = markdown.markdown(response)
+        yield sse_event({"html": html}, event="done")
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/get-bp-logs', methods=['GET'])
 def get_bp_logs_route():
+    try:
+        query = parse_log_query(request.args)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
     mac_address = get_mac_address()
-    range_name = f'{sheet_name}!A:F'
-    data = retrieve_data(spreadsheet_id, range_name)
-    filtered_logs = filter_data_by_mac(data, mac_address)
-    logs = []
-    for row in filtered_logs[1:]:  # Skip header row
-        if len(row) >= 5:
-            logs.append({
-                'timestamp': row[0],
-                'email': row[1],
-                'mac_address': row[2],
-                'diastolic': row[4],
-                'systolic': row[3]
-            })
-
-    return jsonify({"logs": logs})
+    if BP_LOGS_SOURCE == 'local':
+        timestamps, rows = bp_store.timeline(mac_address)
+    else:
+        timestamps, rows = logs_cache.timeline(mac_address)
+    page, next_cursor = page_rows(timestamps, rows, query['since'], query['until'],
+                                  query['limit'], query['cursor'])
+    if query['format'] == 'columnar':
+        payload = rows_to_columns(page)
+    else:
+        payload = {"logs": rows_to_objects(page)}
+    payload['next_cursor'] = next_cursor
+
+    body, headers = encode_json(payload, request.headers.get('Accept-Encoding'))
+    return Response(body, headers=headers)
+
+# Bulk upload of readings as CSV or JSON lines (timestamp, systolic, diastolic and
+# optionally email, on_treatment). The body is read and answered as a stream: one
+# NDJSON result per line, then a summary. Readings are stored for this device only.
+@bp.route('/bp-logs/bulk', methods=['POST'])
+def bulk_bp_logs():
+    upload_format = request.args.get('format') or BULK_FORMATS.get(request.mimetype)
+    if upload_format not in ('csv', 'jsonl'):
+        return jsonify({"error": "send text/csv or application/x-ndjson, or pass format=csv|jsonl"}), 415
+    try:
+        on_treatment = parse_flag(request.args.get('on_treatment'))
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    if 'patient' in request.args:
+        return jsonify({"error": PATIENT_NOT_SUPPORTED}), 400
+    mac_address = get_mac_address()
+
+    # Sheets first: if its queue is full the chunk is rejected before anything is stored
+    def write_chunk(records):
+        get_sheets_writer().enqueue([[record['timestamp'], record['email'], record['mac_address'],
+                                      record['systolic'], record['diastolic']] for record in records])
+        bp_store.append_many(records)
+
+    def generate():
+        for result in ingest(read_records(request.stream, upload_format), write_chunk, mac_address, on_treatment):
+            if 'summary' in result:
+                bulk_rows_total.inc(result['summary']['accepted'], status='accepted')
+                bulk_rows_total.inc(result['summary']['rejected'], status='rejected')
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+# This device's trend: category counts over the last N days, rolling means and consecutive elevated readings
+@bp.route('/analytics/trend', methods=['GET'])
+def analytics_trend():
+    try:
+        query = parse_analytics_query(request.args)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    if 'patient' in request.args:
+        return jsonify({"error": PATIENT_NOT_SUPPORTED}), 400
+    payload = analytics.patient_trend(get_mac_address(), query['days'], query['window'], query['on_treatment'])
+    body, headers = encode_json(payload, request.headers.get('Accept-Encoding'))
+    return Response(body, headers=headers)
+
+# Cohort summary across all patients with readings in the last N days
+@bp.route('/analytics/cohort', methods=['GET'])
+def analytics_cohort():
+    try:
+        query = parse_analytics_query(request.args)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    payload = analytics.cohort_summary(query['days'], query['on_treatment'])
+    body, headers = encode_json(payload, request.headers.get('Accept-Encoding'))
+    return Response(body, headers=headers)
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# Application factory; nothing here talks to Groq or Google, clients are built on first use
+def create_app():
+    app = Flask(__name__)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    app.register_blueprint(bp)
+    # Start the Sheets writer now so spooled rows from a previous run are flushed right away
+    get_sheets_writer()
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run(host='0.0.0.0',port=8000)
\ No newline at end of file
@@ -0,0 +1,293 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+
+from flask import url_for
+from markupsafe import Markup, escape
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+CACHE_SECONDS = 365 * 24 * 60 * 60  # fingerprinted files never change, so caches may keep them for a year
+
+# Bundles for templates/home.html, in the order the page used to load them.
+# Paths are relative to static/. Files that do not exist are skipped with a
+# warning (they used to 404 in the browser).
+BUNDLES = {
+    'home.css': [
+        'css/bootstrap.min.css',
+        'css/style.css',
+        'css/responsive.css',
+        'css/jquery.mCustomScrollbar.min.css',
+        'css/owl.carousel.min.css',
+    ],
+    'home.js': [
+        'js/jquery.min.js',
+        'js/popper.min.js',
+        'js/bootstrap.bundle.min.js',
+        'js/jquery-3.0.0.min.js',  # jQuery Migrate, despite the name
+        'js/plugin.js',
+        'js/jquery.mCustomScrollbar.concat.min.js',
+        'js/custom.js',
+    ],
+}
+IMAGE_DIRS = ['src']
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+IMAGE_MAX_WIDTH = 1600  # larger images are scaled down; nothing on the page is wider
+# Extra renditions: logical name -> (source image, width)
+IMAGE_VARIANTS = {'favicon.png': ('src/main.png', 64)}
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+
+IMPORT_PATTERN = re.compile(r'''@import\s+(?:url\(\s*)?['"]?([^'")\s;]+)['"]?\s*\)?\s*([^;]*);''')
+URL_PATTERN = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CHARSET_PATTERN = re.compile(r'@charset\s+[^;]+;')
+
+
+def _is_external(url):
+    return url.startswith(('http:', 'https:', '//', 'data:', '#', '/'))
+
+
+def _fingerprint(name, data):
+    stem, extension = os.path.splitext(os.path.basename(name))
+    stem = re.sub(r'[^\w.-]+', '-', stem)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{extension}"
+
+
+def _write(name, data):
+    with open(os.path.join(DIST_DIR, name), 'wb') as file:
+        file.write(data)
+
+
+# Write `data` under a fingerprinted name, plus .gz/.br copies for text assets
+def _emit(name, data):
+    filename = _fingerprint(name, data)
+    _write(filename, data)
+    if filename.endswith(COMPRESSIBLE):
+        _write(filename + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        try:
+            import brotli
+        except ImportError:
+            pass
+        else:
+            _write(filename + '.br', brotli.compress(data, quality=11))
+    return filename
+
+
+def _asset_url(filename):
+    return f"/assets/{filename}"
+
+
+# Re-encode (and scale down) one image. Needs Pillow; without it the
+# original bytes are published as-is under a fingerprinted name.
+def build_image(path, width=None, name=None):
+    name = name or path
+    with open(os.path.join(STATIC_DIR, path), 'rb') as file:
+        original = file.read()
+    try:
+        from PIL import Image
+    except ImportError:
+        return {'file': _emit(name, original)}
+
+    import io
+
+    with Image.open(io.BytesIO(original)) as image:
+        image.load()
+        limit = width or IMAGE_MAX_WIDTH
+        if image.width > limit:
+            image = image.resize((limit, round(image.height * limit / image.width)), Image.LANCZOS)
+        entry = {'width': image.width, 'height': image.height}
+        extension = os.path.splitext(name)[1].lower()
+        fallback = io.BytesIO()
+        if extension in ('.jpg', '.jpeg'):
+            image.convert('RGB').save(fallback, 'JPEG', quality=82, optimize=True, progressive=True)
+        else:
+            image.save(fallback, image.format or 'PNG', optimize=True)
+        # Keep the original when re-encoding does not help
+        data = fallback.getvalue() if len(fallback.getvalue()) < len(original) or width else original
+        entry['file'] = _emit(name, data)
+        for image_format, extension in (('AVIF', '.avif'), ('WEBP', '.webp')):
+            encoded = io.BytesIO()
+            try:
+                image.save(encoded, image_format, quality=60 if image_format == 'AVIF' else 80)
+            except (KeyError, OSError, ValueError):
+                continue  # this Pillow build cannot write the format
+            if len(encoded.getvalue()) < len(data):
+                entry[extension[1:]] = _emit(os.path.splitext(name)[0] + extension, encoded.getvalue())
+    return entry
+
+
+# Inline local @imports and point url() references at published images
+def _read_css(path, images, remote_imports, seen):
+    if path in seen:
+        return ''
+    seen.add(path)
+    full_path = os.path.join(STATIC_DIR, path)
+    if not os.path.exists(full_path):
+        print(f"Skipping missing stylesheet static/{path}")
+        return ''
+    with open(full_path, 'r', encoding='utf-8') as file:
+        css = CHARSET_PATTERN.sub('', file.read())
+    base = os.path.dirname(path)
+
+    def inline_import(match):
+        target, media = match.group(1), match.group(2).strip()
+        if _is_external(target):
+            remote_imports.append(match.group(0))
+            return ''
+        inlined = _read_css(os.path.normpath(os.path.join(base, target)), images, remote_imports, seen)
+        return f"@media {media}{{{inlined}}}" if media and inlined else inlined
+
+    def rewrite_url(match):
+        url = match.group(2).strip()
+        if _is_external(url):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        resolved = os.path.normpath(os.path.join(base, target)).replace(os.sep, '/')
+        if resolved in images:
+            return f"url({_asset_url(images[resolved]['file'])}{suffix})"
+        return f"url(/static/{resolved}{suffix})"
+
+    css = IMPORT_PATTERN.sub(inline_import, css)
+    return URL_PATTERN.sub(rewrite_url, css)
+
+
+def minify_css(css):
+    try:
+        from rcssmin import cssmin
+    except ImportError:
+        css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+        css = re.sub(r'\s+', ' ', css)
+        return re.sub(r'\s*([{};,>])\s*', r'\1', css).strip()
+    return cssmin(css)
+
+
+def minify_js(js, path):
+    if path.endswith('.min.js'):
+        return js
+    try:
+        from rjsmin import jsmin
+    except ImportError:
+        return js
+    return jsmin(js)
+
+
+def build_bundle(name, sources, images):
+    parts = []
+    if name.endswith('.css'):
+        remote_imports, seen = [], set()
+        for path in sources:
+            parts.append(_read_css(path, images, remote_imports, seen))
+        # @import is only valid at the top of a stylesheet
+        data = '\n'.join(dict.fromkeys(remote_imports)) + minify_css('\n'.join(parts))
+    else:
+        for path in sources:
+            full_path = os.path.join(STATIC_DIR, path)
+            if not os.path.exists(full_path):
+                print(f"Skipping missing script static/{path}")
+                continue
+            with open(full_path, 'r', encoding='utf-8') as file:
+                parts.append(minify_js(file.read(), path))
+        data = '\n;\n'.join(parts)
+    return {'file': _emit(name, data.encode('utf-8')), 'sources': sources}
+
+
+# Rebuild static/dist from scratch and write the manifest
+def build():
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(DIST_DIR)
+    assets = {}
+    for directory in IMAGE_DIRS:
+        for filename in sorted(os.listdir(os.path.join(STATIC_DIR, directory))):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                path = f"{directory}/{filename}"
+                assets[path] = build_image(path)
+    for name, (source, width) in IMAGE_VARIANTS.items():
+        assets[name] = build_image(source, width=width, name=name)
+    for name, sources in BUNDLES.items():
+        assets[name] = build_bundle(name, sources, assets)
+    with open(MANIFEST_FILE, 'w') as file:
+        json.dump({'assets': assets}, file, indent=1, sort_keys=True)
+    return assets
+
+
+# Template side of the pipeline. With a built manifest, templates get the
+# bundles and fingerprinted images; without one (local development) they
+# fall back to the individual files under static/.
+class AssetManifest:
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.assets = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                self.assets = json.load(file)['assets']
+        except FileNotFoundError:
+            self.assets = {}
+
+    def url(self, name, variant='file'):
+        entry = self.assets.get(name)
+        if entry and entry.get(variant):
+            return _asset_url(entry[variant])
+        source = IMAGE_VARIANTS.get(name, (name,))[0]
+        return url_for('static', filename=source)
+
+    def _sources(self, bundle):
+        if bundle in self.assets:
+            return [self.url(bundle)]
+        return [url_for('static', filename=path) for path in BUNDLES[bundle]
+                if os.path.exists(os.path.join(STATIC_DIR, path))]
+
+    def stylesheets(self, bundle):
+        return Markup(''.join(f'<link rel="stylesheet" href="{escape(url)}">' for url in self._sources(bundle)))
+
+    def scripts(self, bundle):
+        return Markup(''.join(f'<script src="{escape(url)}"></script>' for url in self._sources(bundle)))
+
+    # <picture> with AVIF/WebP sources and the re-encoded original as fallback
+    def picture(self, name, alt='', **attributes):
+        entry = self.assets.get(name, {})
+        sources = ''.join(
+            f'<source type="image/{variant}" srcset="{escape(_asset_url(entry[variant]))}">'
+            for variant in ('avif', 'webp') if entry.get(variant)
+        )
+        for dimension in ('width', 'height'):
+            if entry.get(dimension):
+                attributes.setdefault(dimension, entry[dimension])
+        attributes = ''.join(f' {key}="{escape(value)}"' for key, value in attributes.items())
+        return Markup(f'<picture>{sources}<img src="{escape(self.url(name))}" alt="{escape(alt)}"{attributes}></picture>')
+
+
+# Serve a file from static/dist, picking the brotli or gzip copy the client accepts
+def send_asset(filename, accept_encodings):
+    from flask import abort, send_from_directory
+
+    if filename.endswith(('.gz', '.br')) or not os.path.isfile(os.path.join(DIST_DIR, filename)):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    served, encoding = filename, None
+    for candidate, extension in (('br', '.br'), ('gzip', '.gz')):
+        if accept_encodings[candidate] and os.path.isfile(os.path.join(DIST_DIR, filename + extension)):
+            served, encoding = filename + extension, candidate
+            break
+    response = send_from_directory(DIST_DIR, served, mimetype=mimetype, max_age=CACHE_SECONDS)
+    response.headers['Cache-Control'] = f'public, max-age={CACHE_SECONDS}, immutable'
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+if __name__ == "__main__":
+    # python assets.py build
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        sys.exit("usage: python assets.py build")
+    built = build()
+    total = sum(os.path.getsize(os.path.join(DIST_DIR, name)) for name in os.listdir(DIST_DIR))
+    print(f"Built {len(built)} assets into {DIST_DIR} ({total / 1e6:.1f} MB including compressed copies)")
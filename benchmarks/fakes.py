@@ -0,0 +1,175 @@
+# Local stand-ins for the Groq chat completions API and the Google Sheets
+# values API, used by load_test.py. Both run in a background thread on an
+# ephemeral port and only implement the calls the app makes.
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+
+class _Server:
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _GroqHandler(_QuietHandler):
+    def do_POST(self):
+        fake = self.server.fake
+        request = self._body()
+        with fake.lock:
+            fake.calls += 1
+            fake.prompt_chars += sum(len(message.get('content') or '') for message in request.get('messages', []))
+        tokens = [f'word{i} ' for i in range(fake.tokens)]
+        time.sleep(fake.first_token_latency)
+        if not request.get('stream'):
+            time.sleep(fake.tokens / fake.tokens_per_second)
+            self._send_json({
+                'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ''.join(tokens)}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': fake.tokens, 'total_tokens': fake.tokens},
+            })
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for index, token in enumerate(tokens + [None]):
+            chunk = {
+                'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'delta': {'content': token} if token else {},
+                             'finish_reason': None if token else 'stop'}],
+            }
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+            if token and index < len(tokens) - 1:
+                time.sleep(1 / fake.tokens_per_second)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+
+# Groq-compatible /openai/v1/chat/completions with configurable latency:
+# `first_token_latency` seconds before the first token, then
+# `tokens_per_second` for `tokens` tokens. Supports stream=true.
+class FakeGroq(_Server):
+    def __init__(self, first_token_latency=0.2, tokens_per_second=500.0, tokens=40):
+        super().__init__(_GroqHandler)
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+
+
+RANGE = re.compile(r"^(?P<sheet>[^!]+)!A(?P<start>\d*)(?::[A-Z]+(?P<end>\d*))?$")
+
+
+class _SheetsHandler(_QuietHandler):
+    def _range(self):
+        path = urlparse(self.path).path
+        match = re.match(r'^/v4/spreadsheets/[^/]+/values/(?P<range>[^:]+)(?P<append>:append)?$', path)
+        if not match:
+            return None, False
+        return unquote(match.group('range')), bool(match.group('append'))
+
+    def do_GET(self):
+        fake = self.server.fake
+        range_name, _ = self._range()
+        match = RANGE.match(range_name or '')
+        if not match:
+            self._send_json({'error': {'message': f'bad range {range_name}'}}, 400)
+            return
+        start = int(match.group('start') or 1)
+        with fake.lock:
+            values = [list(row) for row in fake.rows[start - 1:]]
+            fake.get_calls += 1
+            fake.rows_served += len(values)
+        time.sleep(fake.latency)
+        sent = self._send_json({'range': range_name, 'majorDimension': 'ROWS', 'values': values})
+        with fake.lock:
+            fake.bytes_served += sent
+
+    def do_POST(self):
+        fake = self.server.fake
+        range_name, append = self._range()
+        if not append:
+            self._send_json({'error': {'message': 'only values:append is supported'}}, 400)
+            return
+        rows = [[str(value) for value in row] for row in self._body().get('values', [])]
+        time.sleep(fake.latency)
+        with fake.lock:
+            first = len(fake.rows) + 1
+            fake.rows.extend(rows)
+            fake.append_calls += 1
+        self._send_json({'spreadsheetId': 'fake', 'tableRange': range_name,
+                         'updates': {'updatedRange': f'Logs!A{first}:E{first + len(rows) - 1}',
+                                     'updatedRows': len(rows)}})
+
+
+# Sheets values().get / values().append over an in-memory Logs sheet with
+# the app's row schema [timestamp, email, mac, systolic, diastolic].
+class FakeSheets(_Server):
+    HEADER = ['Timestamp', 'Email', 'MAC Address', 'Systolic', 'Diastolic']
+
+    def __init__(self, latency=0.05):
+        super().__init__(_SheetsHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.rows = [list(self.HEADER)]
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.get_calls = 0
+        self.append_calls = 0
+        self.rows_served = 0
+        self.bytes_served = 0
+
+    # Fill the sheet with `total` readings, `per_patient` of which belong to `mac_address`
+    def seed(self, total, mac_address, per_patient):
+        with self.lock:
+            self.rows = [list(self.HEADER)]
+            for i in range(total):
+                mac = mac_address if i % max(total // max(per_patient, 1), 1) == 0 else f'00:00:00:00:{i // 256 % 256:02X}:{i % 256:02X}'
+                timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(1700000000 + i * 600))
+                self.rows.append([timestamp, 'bench@example.com', mac, str(110 + i % 60), str(70 + i % 40)])
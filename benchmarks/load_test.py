@@ -0,0 +1,190 @@
+# Load test for /chat and /get-bp-logs against local Groq and Sheets stand-ins.
+#
+#   python benchmarks/load_test.py [--sheet-sizes 1000,10000,100000] [--concurrency 1,8,32]
+#                                  [--conversations 32] [--groq-latency 0.2] [--sheets-latency 0.05]
+#                                  [--no-response-cache] [--max-rows-per-log N] [--max-p95-ms MS]
+#
+# Each virtual user replays the steps.json intake (greeting, one answer per
+# question, one free-form question for the LLM) in its own session and then
+# fetches its BP logs. For every sheet size and concurrency level the script
+# reports p50/p95/p99 latency and throughput per endpoint, plus how many
+# sheet rows the app pulled from Sheets per /get-bp-logs call, which is what
+# exposes O(rows) regressions such as full-column scans. Each sheet size is
+# loaded once before timing, so rows/log is the steady state, not the cold
+# read every worker pays at startup.
+#
+# --max-rows-per-log and --max-p95-ms turn the run into a gate: the script
+# exits non-zero when any row of the table goes over either budget.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeGroq, FakeSheets  # noqa: E402
+
+ANSWERS = {
+    'name': 'My name is Ann',
+    'age': '34',
+    'gender': 'female',
+    'marital_status': 'married',
+    'reading': '150/95',
+    'on_treatment': 'yes',
+}
+FREE_FORM = 'What does that mean for me?'
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def build_script(intake_flow):
+    return ['hi'] + [ANSWERS.get(slot, 'not sure') for slot, _ in intake_flow.slots] + [FREE_FORM]
+
+
+def post_json(url, payload, session_id):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'X-Session-Id': session_id},
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+        return response.status
+
+
+def get(url):
+    request = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+        return response.status
+
+
+def run_conversation(base_url, script, timings, lock):
+    session_id = uuid.uuid4().hex
+    chat, logs = [], []
+    for message in script:
+        start = time.perf_counter()
+        post_json(f'{base_url}/chat', {'question': message}, session_id)
+        chat.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    get(f'{base_url}/get-bp-logs?limit=100')
+    logs.append(time.perf_counter() - start)
+    with lock:
+        timings['/chat'].extend(chat)
+        timings['/get-bp-logs'].extend(logs)
+
+
+# Replay one conversation before timing anything, so a broken code path
+# (e.g. an import missing from the installed packages) fails the run with
+# the app's own error instead of a bare HTTPError partway through the table
+def check_conversation(base_url, script):
+    try:
+        run_conversation(base_url, script, {'/chat': [], '/get-bp-logs': []}, threading.Lock())
+    except urllib.error.HTTPError as error:
+        body = error.read().decode('utf-8', 'replace')[:500]
+        sys.exit(f"Warm-up conversation failed: {error.code} from {error.url}\n{body}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sheet-sizes', default='1000,10000,100000')
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--conversations', type=int, default=32)
+    parser.add_argument('--patient-rows', type=int, default=200)
+    parser.add_argument('--groq-latency', type=float, default=0.2)
+    parser.add_argument('--groq-tokens-per-second', type=float, default=500.0)
+    parser.add_argument('--sheets-latency', type=float, default=0.05)
+    parser.add_argument('--no-response-cache', action='store_true',
+                        help='send every free-form turn to the fake Groq server')
+    parser.add_argument('--max-rows-per-log', type=float,
+                        help='fail when /get-bp-logs pulls more sheet rows per call than this')
+    parser.add_argument('--max-p95-ms', type=float,
+                        help='fail when any endpoint has a higher p95 latency than this')
+    args = parser.parse_args()
+
+    groq = FakeGroq(args.groq_latency, args.groq_tokens_per_second).start()
+    sheets = FakeSheets(args.sheets_latency).start()
+    workdir = tempfile.mkdtemp(prefix='bp-pal-bench-')
+    os.environ.update({
+        'GROQ_API': 'bench',
+        'GROQ_API_BASE': groq.url,
+        'SHEETS_API_ENDPOINT': sheets.url,
+        'FORM': 'bench',
+        'SHEETS_SPOOL_DIR': os.path.join(workdir, 'spool'),
+        'BP_LOG_STORE': os.path.join(workdir, 'bp_logs.jsonl'),
+        'SESSION_MAX': '100000',
+    })
+    if args.no_response_cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    os.chdir(workdir)
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    import app as bp_app
+
+    server = make_server('127.0.0.1', 0, bp_app.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    script = build_script(bp_app.intake_flow)
+    check_conversation(base_url, script)
+
+    print(f"{'rows':>8} {'conc':>5} {'endpoint':<13} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'req/s':>8} {'rows/log':>9} {'groq':>5}")
+    failures = []
+    for size in [int(value) for value in args.sheet_sizes.split(',')]:
+        sheets.seed(size, bp_app.get_mac_address(), args.patient_rows)
+        bp_app.logs_cache._reset()
+        get(f'{base_url}/get-bp-logs?limit=100')
+        for concurrency in [int(value) for value in args.concurrency.split(',')]:
+            sheets.reset_counters()
+            groq.calls = 0
+            timings = {'/chat': [], '/get-bp-logs': []}
+            lock = threading.Lock()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                futures = [pool.submit(run_conversation, base_url, script, timings, lock)
+                           for _ in range(args.conversations)]
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - start
+            rows_per_log = sheets.rows_served / max(len(timings['/get-bp-logs']), 1)
+            for endpoint, values in timings.items():
+                print(f"{size:>8} {concurrency:>5} {endpoint:<13} {len(values):>5} "
+                      f"{percentile(values, 0.50) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+                      f"{percentile(values, 0.99) * 1000:>8.1f} {len(values) / elapsed:>8.1f} "
+                      f"{rows_per_log:>9.1f} {groq.calls:>5}")
+                p95 = percentile(values, 0.95) * 1000
+                if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+                    failures.append(f"{endpoint} p95 {p95:.1f} ms > {args.max_p95_ms:g} ms "
+                                    f"(rows={size}, conc={concurrency})")
+            if args.max_rows_per_log is not None and rows_per_log > args.max_rows_per_log:
+                failures.append(f"/get-bp-logs pulled {rows_per_log:.1f} rows per call > {args.max_rows_per_log:g} "
+                                f"(rows={size}, conc={concurrency})")
+
+    bp_app.get_sheets_writer().flush(timeout=30)
+    server.shutdown()
+    groq.stop()
+    sheets.stop()
+    if failures:
+        sys.exit("Load test over budget:\n  " + "\n  ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
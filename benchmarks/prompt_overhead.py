@@ -0,0 +1,53 @@
+# Micro-benchmark of the per-request prompt/chain overhead in /chat.
+#
+#   python benchmarks/prompt_overhead.py [iterations]
+#
+# "per request" rebuilds the ChatPromptTemplate and the prompt | model chain
+# on every call, as /chat used to; "prebuilt" only formats the shared
+# intake_prompt that /chat sends, with the session history and slot summary.
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from prompts import build_intake_prompt, intake_prompt
+
+llm = FakeListChatModel(responses=["ok"])
+chat_history = []
+for turn in range(10):
+    chat_history.append(HumanMessage(content=f"My answer number {turn}"))
+    chat_history.append(AIMessage(content=f"Thanks. Here is question number {turn + 1}?"))
+inputs = {
+    'human_input': "120/80",
+    'chat_history': chat_history,
+    'slot_summary': "name: Ann; age: 34; gender: female; marital status: married; reading: unknown; "
+                    "on treatment: unknown",
+    'next_question': "Have you measured your blood pressure recently?",
+}
+
+
+def per_request():
+    chain = build_intake_prompt() | llm
+    chain.first.format_messages(**inputs)
+
+
+def prebuilt():
+    intake_prompt.format_messages(**inputs)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    results = {}
+    for name, func in (("per request", per_request), ("prebuilt", prebuilt)):
+        seconds = min(timeit.repeat(func, number=iterations, repeat=3))
+        results[name] = seconds / iterations * 1e6
+        print(f"{name:>12}: {results[name]:8.1f} us/request")
+    print(f"{'saved':>12}: {results['per request'] - results['prebuilt']:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
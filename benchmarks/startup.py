@@ -0,0 +1,56 @@
+# Measure how long a fresh process takes to import app.py and build the Flask app.
+#
+#   python benchmarks/startup.py [--runs 5] [--max-seconds 5]
+#
+# Each run is a new interpreter, so this is the cold-start cost a new worker
+# pays before it can serve its first request. Exits non-zero when the median
+# exceeds --max-seconds, so CI can track regressions. The app runs in a
+# temporary directory so its spool, uploads and log store never end up in
+# the checkout (and from there in the release zip).
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = (
+    "import time; start = time.perf_counter(); import app; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bp-pal-startup-')
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+               SHEETS_SPOOL_DIR=os.path.join(workdir, 'spool'),
+               BP_LOG_STORE=os.path.join(workdir, 'bp_logs.jsonl'))
+    timings = []
+    try:
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, '-c', MEASURE], cwd=workdir, env=env, check=True,
+                capture_output=True, text=True,
+            ).stdout
+            timings.append(float(output.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    median = statistics.median(timings)
+    print(f"app startup over {args.runs} runs: median {median:.3f}s, "
+          f"min {min(timings):.3f}s, max {max(timings):.3f}s")
+    if args.max_seconds is not None and median > args.max_seconds:
+        sys.exit(f"startup median {median:.3f}s exceeds {args.max_seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
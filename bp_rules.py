@@ -0,0 +1,144 @@
+import json
+import os
+import re
+
+import numpy as np
+
+STEPS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'steps.json')
+
+# Plausible cuff readings; anything outside is treated as "not a reading"
+# so dates like 10/12 or fractions in free text are ignored.
+SYSTOLIC_RANGE = (50, 300)
+DIASTOLIC_RANGE = (30, 200)
+
+READING_PATTERN = re.compile(r'(?<![\d/])(\d{2,3})\s*/\s*(\d{2,3})(?![\d/])')
+BOUND_PATTERN = re.compile(
+    r'\b(SYS|DIA) is (?:(\d+)-(\d+)|(\d+) or more|less than (\d+))'
+)
+RESPONSE_PATTERN = re.compile(r"respond with: '(.*)'\s*$", re.S)
+
+NEGATIVE_ANSWER = re.compile(r"\b(no|nope|not|don'?t|do not|never|none)\b", re.I)
+# "I'm", "taking" and "on medication" only count as yes when not negated ("I'm not taking any")
+POSITIVE_ANSWER = re.compile(
+    r"\b(yes|yeah|yep|yup|i am(?! not)|i'm(?! not)|(?<!not )(?<!n't )taking|(?<!not )on (?:medication|treatment|meds))\b",
+    re.I)
+UNSURE_ANSWER = re.compile(r"\b(not sure|unsure|not certain|don'?t know|do not know|no idea|can'?t remember|maybe)\b",
+                           re.I)
+
+
+# Turn one rule such as "If SYS is 150-159 or DIA is 100-109, respond with: '...'"
+# into ([(field, low, high), ...], combinator, message). Bounds are inclusive.
+def compile_rule(text):
+    condition, _, _ = text.partition('respond with:')
+    bounds = []
+    for field, low, high, at_least, below in BOUND_PATTERN.findall(condition):
+        if low:
+            bounds.append((field, int(low), int(high)))
+        elif at_least:
+            bounds.append((field, int(at_least), None))
+        else:
+            bounds.append((field, None, int(below) - 1))
+    if not bounds:
+        raise ValueError(f"No SYS/DIA thresholds found in rule: {text!r}")
+    combinator = 'and' if re.search(r'\d and (SYS|DIA)\b', condition) else 'or'
+    match = RESPONSE_PATTERN.search(text)
+    message = match.group(1) if match else text
+    return bounds, combinator, message
+
+
+# Compile the `blood_pressure_evaluation` section of steps.json (or an
+# `evaluation_rules` dict of the same shape) into an ordered rule table per
+# treatment status. The first matching rule wins; the last one is the fallback.
+def compile_rules(evaluation_rules):
+    table = {}
+    for status, rules in evaluation_rules.items():
+        table[status] = [(category, *compile_rule(text)) for category, text in rules.items()]
+    return table
+
+
+def load_rules(path=STEPS_FILE):
+    with open(path, 'r') as file:
+        steps = json.load(file)
+    return compile_rules(steps['steps']['blood_pressure_evaluation'])
+
+
+RULES = load_rules()
+
+
+def _status(on_treatment):
+    return 'on_treatment' if on_treatment else 'not_on_treatment'
+
+
+def _in_bounds(value, low, high):
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+# Classify a single reading, returning (category, guidance message)
+def evaluate_reading(systolic, diastolic, on_treatment, rules=RULES):
+    table = rules[_status(on_treatment)]
+    values = {'SYS': systolic, 'DIA': diastolic}
+    for category, bounds, combinator, message in table:
+        hits = [_in_bounds(values[field], low, high) for field, low, high in bounds]
+        if (all(hits) if combinator == 'and' else any(hits)):
+            return category, message
+    category, _, _, message = table[-1]
+    return category, message
+
+
+# Vectorized classification of many readings at once. `on_treatment` may be a
+# single bool or an array aligned with the readings. Returns category names.
+def classify_batch(systolic, diastolic, on_treatment=False, rules=RULES):
+    systolic = np.asarray(systolic, dtype=np.int64)
+    diastolic = np.asarray(diastolic, dtype=np.int64)
+    treated = np.broadcast_to(np.asarray(on_treatment, dtype=bool), systolic.shape)
+    values = {'SYS': systolic, 'DIA': diastolic}
+    result = np.empty(systolic.shape, dtype=object)
+    for status, mask in (('on_treatment', treated), ('not_on_treatment', ~treated)):
+        if not mask.any():
+            continue
+        table = rules[status]
+        conditions = []
+        for _, bounds, combinator, _ in table:
+            hits = []
+            for field, low, high in bounds:
+                hit = np.ones(systolic.shape, dtype=bool)
+                if low is not None:
+                    hit &= values[field] >= low
+                if high is not None:
+                    hit &= values[field] <= high
+                hits.append(hit)
+            conditions.append(np.logical_and.reduce(hits) if combinator == 'and' else np.logical_or.reduce(hits))
+        categories = np.array([category for category, _, _, _ in table], dtype=object)
+        index = np.select(conditions, np.arange(len(table)), default=len(table) - 1)
+        result[mask] = categories[index[mask]]
+    return result
+
+
+# Pull every "SYS/DIA" reading out of free text ("bp 150/95", "150 / 95", ...)
+def extract_readings(text):
+    readings = []
+    for systolic, diastolic in READING_PATTERN.findall(text or ''):
+        systolic, diastolic = int(systolic), int(diastolic)
+        if (SYSTOLIC_RANGE[0] <= systolic <= SYSTOLIC_RANGE[1]
+                and DIASTOLIC_RANGE[0] <= diastolic <= DIASTOLIC_RANGE[1]
+                and systolic > diastolic):
+            readings.append((systolic, diastolic))
+    return readings
+
+
+# Interpret an answer to "are you on blood pressure medication?".
+# Returns True/False, or None if the answer is unclear, unsure or says both
+# ("yes, I'm not missing doses"), so the question is asked again rather
+# than scoring the reading against the wrong table.
+def parse_treatment_answer(text):
+    text = (text or '').replace('\u2019', "'")
+    if UNSURE_ANSWER.search(text):
+        return None
+    negative, positive = NEGATIVE_ANSWER.search(text), POSITIVE_ANSWER.search(text)
+    if negative and positive:
+        return None
+    if negative:
+        return False
+    if positive:
+        return True
+    return None
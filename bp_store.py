@@ -0,0 +1,201 @@
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+
+from limits import run_blocking
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# Append-only local store for BP readings, one JSON record per line.
+#
+# Writers append whole lines under an exclusive lock on a side lock file, so
+# several workers can share one store. Each process keeps an in-memory index
+# of byte offsets per patient (ordered by timestamp) and catches up on lines
+# written by other workers before every read. A line without its trailing
+# newline is a torn write from a crash and is never indexed. compact()
+# rewrites the log atomically; other processes notice the new inode and
+# rebuild their index.
+class BPLogStore:
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = threading.Lock()
+        self._index = {}  # mac_address -> ([timestamps], [offsets])
+        self._offset = 0
+        self._inode = None
+        if legacy_path and os.path.exists(legacy_path) and not os.path.exists(path):
+            self._migrate(legacy_path)
+
+    @contextmanager
+    def _file_lock(self, mode):
+        with open(self.lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, mode | fcntl.LOCK_NB)
+            except BlockingIOError:
+                run_blocking(fcntl.flock, lock_file, mode)  # another writer holds it; wait off the event loop
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Import the old whole-file {mac: [{systolic, diastolic, timestamp}]} JSON store
+    def _migrate(self, legacy_path):
+        with open(legacy_path, 'r') as file:
+            legacy = json.load(file)
+        records = [
+            dict(entry, mac_address=mac_address, email=entry.get('email'))
+            for mac_address, entries in legacy.items()
+            for entry in entries
+        ]
+        with self._file_lock(fcntl.LOCK_EX):
+            if not os.path.exists(self.path):
+                self._write_atomically(records)
+
+    def _write_atomically(self, records):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(b''.join(self._encode(record) for record in records))
+            tmp.flush()
+            run_blocking(os.fsync, tmp.fileno())
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _encode(record):
+        return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def append(self, mac_address, systolic, diastolic, timestamp=None, email=None):
+        self.append_many([{
+            'timestamp': timestamp or datetime.now().strftime(TIMESTAMP_FORMAT),
+            'email': email,
+            'mac_address': mac_address,
+            'systolic': systolic,
+            'diastolic': diastolic,
+        }])
+
+    # Append several records with a single write and fsync
+    def append_many(self, records):
+        data = b''.join(self._encode(record) for record in records)
+        if not data:
+            return
+        with self._file_lock(fcntl.LOCK_EX):
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b'\n':
+                    data = b'\n' + data  # seal off a torn line left by a crash
+                os.write(fd, data)
+                run_blocking(os.fsync, fd)
+            finally:
+                os.close(fd)
+
+    def _catch_up(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._index, self._offset, self._inode = {}, 0, None
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._index, self._offset, self._inode = {}, 0, stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as file:
+            file.seek(self._offset)
+            offset = self._offset
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # partial line, possibly still being written
+                try:
+                    record = json.loads(line)
+                    timestamps, offsets = self._index.setdefault(record['mac_address'], ([], []))
+                    position = bisect_right(timestamps, record['timestamp'])
+                    timestamps.insert(position, record['timestamp'])
+                    offsets.insert(position, offset)
+                except (ValueError, KeyError, TypeError):
+                    pass  # torn or foreign line
+                offset += len(line)
+            self._offset = offset
+
+    def _read(self, offsets):
+        records = []
+        with open(self.path, 'rb') as file:
+            for offset in offsets:
+                file.seek(offset)
+                records.append(json.loads(file.readline()))
+        return records
+
+    # Readings for one patient in timestamp order, as {systolic, diastolic, timestamp} dicts
+    def get(self, mac_address):
+        return [
+            {'systolic': record['systolic'], 'diastolic': record['diastolic'], 'timestamp': record['timestamp']}
+            for record in self._records(mac_address)
+        ]
+
+    # Sorted timestamps plus rows in the Logs sheet schema, like LogsReadCache.timeline
+    def timeline(self, mac_address):
+        records = self._records(mac_address)
+        rows = [[record['timestamp'], record.get('email'), record['mac_address'],
+                 record['systolic'], record['diastolic']] for record in records]
+        return [row[0] for row in rows], rows
+
+    def _records(self, mac_address):
+        with self._lock:
+            with self._file_lock(fcntl.LOCK_SH):
+                self._catch_up()
+                _, offsets = self._index.get(mac_address, ([], []))
+                return self._read(offsets) if offsets else []
+
+    # Rows (in the Logs sheet schema) appended after `cursor`, in file order.
+    # Returns (cursor, rows, reset) like LogsReadCache.rows_since; reset means
+    # the log was compacted or replaced and reading restarted from the top.
+    def rows_since(self, cursor=None):
+        inode, offset = cursor or (None, 0)
+        rows = []
+        with self._file_lock(fcntl.LOCK_SH):
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return (None, 0), rows, cursor is not None
+            reset = stat.st_ino != inode or stat.st_size < offset
+            if reset:
+                offset = 0
+            with open(self.path, 'rb') as file:
+                file.seek(offset)
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                        rows.append([record['timestamp'], record.get('email'), record['mac_address'],
+                                     record['systolic'], record['diastolic']])
+                    except (ValueError, KeyError, TypeError):
+                        pass  # torn or foreign line
+        return (stat.st_ino, offset), rows, reset
+
+    # Rewrite the log grouped by patient and ordered by time, dropping torn lines
+    def compact(self):
+        with self._lock:
+            with self._file_lock(fcntl.LOCK_EX):
+                self._catch_up()
+                records = []
+                for mac_address in sorted(self._index):
+                    records.extend(self._read(self._index[mac_address][1]))
+                self._write_atomically(records)
+                self._index, self._offset, self._inode = {}, 0, None
+        return len(records)
+
+
+if __name__ == "__main__":
+    # python bp_store.py compact [path]
+    if len(sys.argv) < 2 or sys.argv[1] != 'compact':
+        sys.exit("usage: python bp_store.py compact [path]")
+    store = BPLogStore(sys.argv[2] if len(sys.argv) > 2 else os.getenv("BP_LOG_STORE", "bp_logs.jsonl"))
+    print(f"Compacted {store.compact()} readings into {store.path}")
@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+import queue
+from datetime import datetime
+from itertools import islice
+
+from bp_rules import DIASTOLIC_RANGE, SYSTOLIC_RANGE, classify_batch
+from log_queries import FALSE_VALUES, TIMESTAMP_FORMAT, TRUE_VALUES, parse_time_bound
+
+CHUNK_SIZE = 200  # rows validated, classified and written together
+
+
+# Stream records out of an upload without reading it all into memory.
+# Yields (line number, dict) or (line number, ValueError) for unreadable lines.
+def read_records(stream, upload_format):
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8-sig', errors='replace', newline='')
+    if upload_format == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, ValueError("not valid JSON")
+            continue
+        yield line_number, record if isinstance(record, dict) else ValueError("expected a JSON object")
+
+
+def _int(record, field, bounds):
+    value = record.get(field)
+    try:
+        value = int(str(value).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a whole number")
+    if not bounds[0] <= value <= bounds[1]:
+        raise ValueError(f"{field} must be between {bounds[0]} and {bounds[1]}")
+    return value
+
+
+# Interpret a true/false query or column value, falling back to `default` when empty
+def parse_flag(value, default=False):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value not in TRUE_VALUES + FALSE_VALUES:
+        raise ValueError("on_treatment must be true or false")
+    return value in TRUE_VALUES
+
+
+# Check one uploaded record with the same plausibility limits as readings
+# typed into chat, and normalize it to a bp_store record. Readings always
+# belong to `mac_address`; a row naming another device is rejected.
+def validate_record(record, mac_address, on_treatment):
+    if record.get('mac_address') and record['mac_address'] != mac_address:
+        raise ValueError("mac_address must be this device's; readings for other patients cannot be uploaded")
+    systolic = _int(record, 'systolic', SYSTOLIC_RANGE)
+    diastolic = _int(record, 'diastolic', DIASTOLIC_RANGE)
+    if systolic <= diastolic:
+        raise ValueError("systolic must be higher than diastolic")
+    try:
+        timestamp = record.get('timestamp')
+        timestamp = parse_time_bound(str(timestamp) if timestamp else None) or datetime.now().strftime(TIMESTAMP_FORMAT)
+    except ValueError:
+        raise ValueError("timestamp must be an ISO date and time, e.g. 2024-05-01T08:30:00")
+    return {
+        'timestamp': timestamp,
+        'email': record.get('email') or None,
+        'mac_address': mac_address,
+        'systolic': systolic,
+        'diastolic': diastolic,
+    }, parse_flag(record.get('on_treatment'), on_treatment)
+
+
+def _checked(records, mac_address, on_treatment):
+    for line_number, record in records:
+        if isinstance(record, ValueError):
+            yield {'line': line_number, 'status': 'error', 'error': str(record)}, None, None
+            continue
+        try:
+            stored, treated = validate_record(record, mac_address, on_treatment)
+        except ValueError as error:
+            yield {'line': line_number, 'status': 'error', 'error': str(error)}, None, None
+            continue
+        yield {'line': line_number, 'status': 'ok', 'timestamp': stored['timestamp']}, stored, treated
+
+
+# Validate, classify and store an upload chunk by chunk, yielding one result
+# per line and a final summary. `write_chunk(records)` stores a list of valid
+# records and raises queue.Full when the Sheets queue cannot take them; the
+# upload then stops and the summary says which line to resume from.
+def ingest(records, write_chunk, mac_address, on_treatment=False, chunk_size=CHUNK_SIZE):
+    summary = {'accepted': 0, 'rejected': 0, 'resume_from_line': None}
+    checked = _checked(records, mac_address, on_treatment)
+    while True:
+        chunk = list(islice(checked, chunk_size))
+        if not chunk:
+            break
+        accepted = [(result, stored, treated) for result, stored, treated in chunk if stored is not None]
+        if accepted:
+            categories = classify_batch([stored['systolic'] for _, stored, _ in accepted],
+                                        [stored['diastolic'] for _, stored, _ in accepted],
+                                        [treated for _, _, treated in accepted])
+            try:
+                write_chunk([stored for _, stored, _ in accepted])
+            except queue.Full:
+                summary['resume_from_line'] = chunk[0][0]['line']
+                yield {'summary': summary, 'error': "Too many readings are waiting for Google Sheets; retry later"}
+                return
+            for (result, _, _), category in zip(accepted, categories):
+                result['category'] = category
+        summary['accepted'] += len(accepted)
+        summary['rejected'] += len(chunk) - len(accepted)
+        for result, _, _ in chunk:
+            yield result
+    yield {'summary': summary}
@@ -0,0 +1,113 @@
+import os
+import time
+
+from lazy import lazy
+from limits import ConnectionPool, UpstreamLimiter
+from metrics import sheets_bytes_total, sheets_calls_total, sheets_seconds
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+model = 'llama3-8b-8192'
+
+# Outbound limits: concurrent calls per upstream, and how long a call may take
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", 64))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", 30))
+SHEETS_MAX_CONCURRENCY = int(os.getenv("SHEETS_MAX_CONCURRENCY", 16))
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", 15))
+# Point the Sheets client at another server, e.g. the local stand-in used by benchmarks/load_test.py
+SHEETS_API_ENDPOINT = os.getenv("SHEETS_API_ENDPOINT")
+UPSTREAM_WAIT = float(os.getenv("UPSTREAM_WAIT", 5))  # seconds to wait for a free slot before answering 503
+
+groq_limiter = UpstreamLimiter('Groq', GROQ_MAX_CONCURRENCY, UPSTREAM_WAIT)
+
+
+# Service account details from the environment
+def google_credentials_info():
+    private_key = os.getenv("GOOGLE_PRIVATE_KEY")
+    if not private_key:
+        raise RuntimeError("GOOGLE_PRIVATE_KEY is not set; Google Sheets is unavailable")
+    return {
+        "type": os.getenv("GOOGLE_TYPE"),
+        "project_id": os.getenv("GOOGLE_PROJECT_ID"),
+        "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID"),
+        "private_key": private_key.replace("\\n", "\n"),
+        "client_email": os.getenv("GOOGLE_CLIENT_EMAIL"),
+        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+        "auth_uri": os.getenv("GOOGLE_AUTH_URI"),
+        "token_uri": os.getenv("GOOGLE_TOKEN_URI"),
+        "auth_provider_x509_cert_url": os.getenv("GOOGLE_AUTH_PROVIDER_X509_CERT_URL"),
+        "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL"),
+        "universe_domain": os.getenv("GOOGLE_UNIVERSE_DOMAIN"),
+    }
+
+
+@lazy
+def get_sheets_credentials():
+    # Imported here so that starting the app does not pay for the Google client libraries
+    from google.auth.credentials import AnonymousCredentials
+    from google.oauth2.service_account import Credentials
+
+    if SHEETS_API_ENDPOINT and not os.getenv("GOOGLE_PRIVATE_KEY"):
+        return AnonymousCredentials()
+    return Credentials.from_service_account_info(google_credentials_info(), scopes=SCOPES)
+
+
+@lazy
+def get_sheets_service():
+    from googleapiclient.discovery import build
+
+    # Use the discovery document bundled with google-api-python-client instead of fetching it
+    client_options = {'api_endpoint': SHEETS_API_ENDPOINT} if SHEETS_API_ENDPOINT else None
+    return build('sheets', 'v4', credentials=get_sheets_credentials(), static_discovery=True, cache_discovery=False,
+                 client_options=client_options)
+
+
+# Wraps an authorized httplib2 connection to count Sheets calls, bytes and latency
+class MeteredHttp:
+    def __init__(self, http):
+        self.http = http
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    def request(self, uri, method='GET', body=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response, content = self.http.request(uri, method, body, *args, **kwargs)
+        except Exception:
+            sheets_calls_total.inc(method=method, status='error')
+            raise
+        finally:
+            sheets_seconds.observe(time.perf_counter() - start, method=method)
+        sheets_calls_total.inc(method=method, status=response.status)
+        sheets_bytes_total.inc(len(body or b''), direction='sent')
+        sheets_bytes_total.inc(len(content or b''), direction='received')
+        return response, content
+
+
+# httplib2 connections are not safe to share between concurrent requests, so
+# each Sheets call borrows an authorized connection from a bounded pool
+def new_sheets_http():
+    import google_auth_httplib2
+    import httplib2
+
+    return MeteredHttp(google_auth_httplib2.AuthorizedHttp(get_sheets_credentials(),
+                                                          http=httplib2.Http(timeout=SHEETS_TIMEOUT)))
+
+
+sheets_pool = ConnectionPool('Google Sheets', new_sheets_http, SHEETS_MAX_CONCURRENCY, UPSTREAM_WAIT)
+
+
+@lazy
+def get_groq_chat():
+    from langchain_groq import ChatGroq
+
+    from groq_metrics import GroqMetricsHandler
+
+    return ChatGroq(
+        groq_api_key=os.getenv("GROQ_API"),
+        temperature=0.0,  # deterministic answers, so cached responses match what Groq would return
+        model_name=model,
+        timeout=GROQ_TIMEOUT,
+        max_retries=1,
+        callbacks=[GroqMetricsHandler()],
+    )
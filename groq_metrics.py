@@ -0,0 +1,57 @@
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import groq_errors_total, groq_first_token_seconds, groq_seconds, groq_tokens, groq_tokens_total
+
+
+def _token_usage(response):
+    usage = (response.llm_output or {}).get('token_usage') or {}
+    if usage:
+        return usage.get('prompt_tokens'), usage.get('completion_tokens')
+    # Streamed completions carry usage on the final message instead
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if metadata:
+                return metadata.get('input_tokens'), metadata.get('output_tokens')
+    return None, None
+
+
+# LangChain callback attached to the ChatGroq client: records latency, time
+# to first token when streaming, token counts and errors for every call,
+# whether it comes from /chat's invoke or /chat/stream's stream.
+class GroqMetricsHandler(BaseCallbackHandler):
+    def __init__(self):
+        self._runs = {}  # run_id -> [start, first token time or None]
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._runs[run_id] = [time.perf_counter(), None]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None or run[1] is not None:
+                return
+            run[1] = time.perf_counter()
+        groq_first_token_seconds.observe(run[1] - run[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        groq_seconds.observe(time.perf_counter() - run[0], mode='stream' if run[1] else 'predict')
+        prompt_tokens, completion_tokens = _token_usage(response)
+        for kind, count in (('prompt', prompt_tokens), ('completion', completion_tokens)):
+            if count:
+                groq_tokens.observe(count, kind=kind)
+                groq_tokens_total.inc(count, kind=kind)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+        groq_errors_total.inc(error=type(error).__name__)
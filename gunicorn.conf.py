@@ -0,0 +1,30 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# gevent workers serve each request on a greenlet, so a request waiting on
+# Groq or Google Sheets no longer holds an OS thread; one process can keep
+# hundreds of chats open. Outbound concurrency is capped separately by the
+# limiters in clients.py (GROQ_MAX_CONCURRENCY, SHEETS_MAX_CONCURRENCY).
+# Local storage is gevent-safe: the SQLite session backend shares one
+# connection per worker, and the fsync/flock calls of bp_store and the Sheets
+# spool run on gevent's native thread pool (limits.run_blocking).
+#
+# Workers and sessions go together: the in-memory session backend is per
+# process, and requests from one browser land on any worker, so with more
+# than one worker the intake would forget answers between turns. More than
+# one worker therefore defaults SESSION_BACKEND to sqlite (SESSION_DB, one
+# file shared by the workers on this host). Set GUNICORN_WORKERS=1 to keep
+# sessions in memory.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+if workers > 1:
+    # Read by create_session_store in every worker, which inherit the master's environment
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    if os.environ["SESSION_BACKEND"] != "sqlite":
+        print(f"Warning: SESSION_BACKEND={os.environ['SESSION_BACKEND']} keeps sessions per worker; "
+              f"with {workers} workers chats can lose their intake state between turns")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 500))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30  # lets the Sheets write-behind queue flush on shutdown
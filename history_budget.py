@@ -0,0 +1,150 @@
+import re
+from functools import lru_cache
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from bp_rules import extract_readings
+from lazy import lazy
+
+# Rough BPE stand-in used when tiktoken is not available: words are split
+# into pieces of at most four characters and every symbol is its own token,
+# which slightly overestimates Llama 3 token counts for English chat text.
+APPROX_TOKEN = re.compile(r'\w{1,4}|[^\w\s]')
+MESSAGE_OVERHEAD = 5  # role header and end-of-turn tokens around each chat message
+SUMMARY_LINE_CHARS = 120  # how much of each folded user message the summary keeps
+SUMMARY_READINGS = 5  # most recent folded BP readings listed in the summary
+
+
+@lazy
+def get_encoding():
+    try:
+        import tiktoken
+
+        # Llama 3's tokenizer is a tiktoken BPE; cl100k_base is the closest bundled encoding
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        return None
+
+
+def _count_tokens(text):
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text or '', disallowed_special=()))
+    return len(APPROX_TOKEN.findall(text or ''))
+
+
+# Messages are counted again on every turn while they stay in the history
+@lru_cache(maxsize=8192)
+def count_tokens(text):
+    return _count_tokens(text)
+
+
+def message_tokens(message):
+    return count_tokens(message.content) + MESSAGE_OVERHEAD
+
+
+# Cut text to at most `max_tokens` tokens, keeping the start
+def truncate_to_tokens(text, max_tokens):
+    if _count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def _shorten(text, limit=SUMMARY_LINE_CHARS):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+# The verbatim messages, with the add_user_message/add_ai_message interface
+# of LangChain's chat message histories
+class ChatHistory:
+    def __init__(self, messages=None):
+        self.messages = list(messages or [])
+
+    def add_user_message(self, content):
+        self.messages.append(HumanMessage(content=content))
+
+    def add_ai_message(self, content):
+        self.messages.append(AIMessage(content=content))
+
+
+# Per-session chat history that fits a token budget.
+#
+# The most recent messages are kept verbatim. When the stored history grows
+# past `max_messages` or `history_tokens`, the oldest turns are folded into
+# a running summary, one turn at a time, so each message is summarized once:
+# any BP readings the user gave plus a short line per user message. The
+# summary itself is capped at `summary_tokens` by dropping its oldest lines.
+# Its state is a plain dict so SessionStore can persist it with the messages.
+#
+# prompt_history() picks what goes into one prompt: the summary (as a system
+# message) and as many recent messages as fit next to the fixed parts of
+# the prompt within `budget` tokens.
+class TokenBudgetMemory:
+    def __init__(self, budget=2048, history_tokens=1024, summary_tokens=256, max_messages=40, state=None):
+        self.budget = budget
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.max_messages = max_messages
+        self.chat_memory = ChatHistory()
+        self.state = state or {'lines': [], 'readings': [], 'folded': 0}
+
+    def summary(self):
+        if not self.state['lines'] and not self.state['readings']:
+            return None
+        parts = ["Summary of earlier messages in this conversation."]
+        if self.state['readings']:
+            parts.append("BP readings shared earlier: " + ', '.join(self.state['readings']) + '.')
+        if self.state['lines']:
+            parts.append("The user said: " + ' | '.join(self.state['lines']))
+        return ' '.join(parts)
+
+    def _fold(self, message):
+        if message.type != 'human':
+            return  # assistant turns are questions and guidance we can regenerate
+        readings = [f"{systolic}/{diastolic}" for systolic, diastolic in extract_readings(message.content)]
+        self.state['readings'] = (self.state['readings'] + readings)[-SUMMARY_READINGS:]
+        self.state['lines'].append(_shorten(message.content))
+        while self.state['lines'] and count_tokens(self.summary() or '') > self.summary_tokens:
+            self.state['lines'].pop(0)
+
+    # Fold the oldest turns into the summary until the verbatim history is within limits
+    def compact(self):
+        messages = self.chat_memory.messages
+        total = sum(message_tokens(message) for message in messages)
+        folded = 0
+        while folded < len(messages) and (len(messages) - folded > self.max_messages or total > self.history_tokens):
+            total -= message_tokens(messages[folded])
+            self._fold(messages[folded])
+            folded += 1
+        if folded:
+            self.chat_memory.messages = messages[folded:]
+            self.state['folded'] += folded
+        return folded
+
+    # History for one prompt. `fixed_tokens` is what the rest of the prompt
+    # (system prompt, the new user message) already uses.
+    def prompt_history(self, fixed_tokens=0):
+        remaining = self.budget - fixed_tokens
+        history = []
+        summary = self.summary()
+        if summary:
+            summary_message = SystemMessage(content=summary)
+            if message_tokens(summary_message) <= remaining:
+                remaining -= message_tokens(summary_message)
+                history.append(summary_message)
+        recent = []
+        for message in reversed(self.chat_memory.messages):
+            cost = message_tokens(message)
+            if cost > remaining:
+                break
+            remaining -= cost
+            recent.append(message)
+        return history + recent[::-1]
@@ -0,0 +1,221 @@
+import json
+import re
+
+from bp_rules import STEPS_FILE, RESPONSE_PATTERN, evaluate_reading, extract_readings, parse_treatment_answer
+
+# Which slot a steps.json question fills, matched in order against the question text
+SLOT_PATTERNS = [
+    ('name', re.compile(r'\bname\b', re.I)),
+    ('marital_status', re.compile(r'\bmarital\b', re.I)),
+    ('gender', re.compile(r'\bgender\b', re.I)),
+    ('age', re.compile(r'\bage\b', re.I)),
+    ('on_treatment', re.compile(r'\b(treatment|medication)\b', re.I)),
+    ('reading', re.compile(r'\bblood pressure\b', re.I)),
+]
+# Instructions meant for the model, e.g. "(This question must be asked.)"
+MODEL_NOTE = re.compile(r'\s*\([^)]*\bmust\b[^)]*\)')
+
+GREETING = re.compile(r"^\s*(hi|hello|hey|hiya|good (morning|afternoon|evening)|salam|start)\b[\s!.,]*$", re.I)
+NAME_WORDS = r"([a-z][a-z'\-]*(?:\s+[a-z][a-z'\-]*){0,2})"
+# Unambiguous introductions are taken any time; "I'm ..." only answers the name question
+NAME_INTRO = re.compile(r"\b(?:my name is|my name's|name is|call me)\s+" + NAME_WORDS, re.I)
+SELF_INTRO = re.compile(r"\b(?:i am|i['\u2019]m|this is)\s+" + NAME_WORDS, re.I)
+NAME_ANSWER = re.compile(r"^\s*" + NAME_WORDS + r"[\s.!]*$", re.I)
+# Words that end a name, or show that "I'm ..." is not an introduction at all
+NOT_A_NAME = {
+    'yes', 'no', 'ok', 'okay', 'hi', 'hello', 'hey', 'thanks', 'what', 'why', 'how', 'sure',
+    'not', 'on', 'off', 'a', 'an', 'the', 'and', 'but', 'so', 'very', 'really', 'just', 'still', 'also',
+    'in', 'at', 'to', 'from', 'with', 'about', 'my', 'here', 'back', 'now', 'fine', 'good', 'well', 'unwell',
+    'worried', 'scared', 'anxious', 'concerned', 'afraid', 'feeling', 'sick', 'tired', 'dizzy', 'pregnant',
+    'taking', 'using', 'having', 'married', 'single', 'female', 'male', 'unsure', 'confused', 'going',
+}
+AGE = re.compile(r'(?<![\d/])(\d{1,3})(?![\d/])')
+# 'other' goes first, and a single letter only counts as the whole answer (the "m" in "I'm" is not "male")
+GENDERS = [
+    ('other', re.compile(r'\b(other|non[- ]?binary|prefer not)\b', re.I)),
+    ('female', re.compile(r'\b(female|woman|girl)\b|^\s*f\s*[.!]?\s*$', re.I)),
+    ('male', re.compile(r'\b(male|man|boy)\b|^\s*m\s*[.!]?\s*$', re.I)),
+]
+NO_READING = re.compile(r"\b(no|not yet|haven'?t|have not|didn'?t|did not|don'?t know)\b", re.I)
+# Conclusion from steps.json per category. Categories without one (on
+# treatment 'low', which needs urgent contact) get no conclusion at all,
+# rather than the "no immediate need" of normal_case.
+CONCLUSION_FOR = {
+    'severe': 'severe_case',
+    'high': 'further_evaluation',
+    'raised': 'further_evaluation',
+    'normal': 'normal_case',
+    'high_normal': 'normal_case',
+    'low_normal': 'normal_case',
+}
+# When one message has several readings, the most urgent conclusion is given
+CONCLUSION_PRIORITY = ('severe_case', 'further_evaluation', 'normal_case')
+INTRO = "Hello! I'm here to help with your hypertension assessment."
+
+
+def parse_name(message, asked):
+    match = NAME_INTRO.search(message)
+    if not match and asked:
+        match = SELF_INTRO.search(message) or NAME_ANSWER.match(message)
+    if not match:
+        return None
+    words = []
+    for word in match.group(1).split():
+        if word.lower() in NOT_A_NAME:
+            break
+        words.append(word)
+    return ' '.join(words).title() if words else None
+
+
+def parse_age(message, asked):
+    if not asked and 'old' not in message.lower():
+        return None
+    for value in AGE.findall(message):
+        if 0 < int(value) <= 120:
+            return int(value)
+    return None
+
+
+def parse_gender(message, asked):
+    if not asked and 'gender' not in message.lower():
+        return None
+    for gender, pattern in GENDERS:
+        if pattern.search(message):
+            return gender
+    return None
+
+
+def parse_treatment(message, asked):
+    if not asked and not re.search(r'\b(treatment|medication|meds|tablets)\b', message, re.I):
+        return None
+    return parse_treatment_answer(message)
+
+
+# A reading can arrive at any time; "no" to the reading question records
+# that none is available yet (False) so the flow can move on.
+def parse_reading(message, asked):
+    readings = extract_readings(message)
+    if readings:
+        return list(readings[-1])
+    if asked and NO_READING.search(message):
+        return False
+    return None
+
+
+def parse_text(message, asked):
+    message = message.strip()
+    return message if asked and message and '?' not in message else None
+
+
+PARSERS = {
+    'name': parse_name,
+    'age': parse_age,
+    'gender': parse_gender,
+    'on_treatment': parse_treatment,
+    'reading': parse_reading,
+}
+
+
+# Server-side intake flow built from the steps in steps.json.
+#
+# Every question becomes a slot. The flow asks the questions in order and
+# fills slots from the answers. Every reading in a message is evaluated with
+# bp_rules, including a repeat of an earlier one ("repeat the reading" is
+# part of the guidance); readings sent before the treatment status is known
+# wait in 'pending' and are evaluated once it is. handle() returns the
+# reply to send, or None when the answer could not be understood and the
+# LLM should respond using summary() and next_question() as its context.
+# The per-session state is a plain dict so it can live in Session.context.
+class IntakeFlow:
+    def __init__(self, steps):
+        self.slots = []  # (slot, question) in the order they are asked
+        for step in steps.values():
+            for question in step.get('questions', []):
+                slot = next((name for name, pattern in SLOT_PATTERNS if pattern.search(question)), None)
+                slot = slot or re.sub(r'\W+', '_', question.lower()).strip('_')
+                self.slots.append((slot, MODEL_NOTE.sub('', question)))
+        self.conclusions = {
+            name: (RESPONSE_PATTERN.search(text).group(1) if RESPONSE_PATTERN.search(text) else text)
+            for name, text in steps.get('conclusion', {}).items()
+        }
+
+    @classmethod
+    def from_file(cls, path=STEPS_FILE):
+        with open(path, 'r') as file:
+            return cls(json.load(file)['steps'])
+
+    @staticmethod
+    def new_state():
+        return {'slots': {}, 'asked': None, 'pending': []}
+
+    def next_question(self, state):
+        for slot, question in self.slots:
+            if slot not in state['slots']:
+                return slot, question
+        return None, None
+
+    def summary(self, state):
+        parts = []
+        for slot, _ in self.slots:
+            value = state['slots'].get(slot)
+            if slot == 'reading' and value:
+                value = f"{value[0]}/{value[1]}"
+            elif slot == 'on_treatment' and value is not None:
+                value = 'yes' if value else 'no'
+            elif slot == 'reading' and value is False:
+                value = 'not measured'
+            parts.append(f"{slot.replace('_', ' ')}: {value if value is not None else 'unknown'}")
+        return '; '.join(parts)
+
+    def evaluate(self, readings, on_treatment):
+        messages, conclusions = [], set()
+        for systolic, diastolic in readings:
+            category, message = evaluate_reading(systolic, diastolic, on_treatment)
+            messages.append(f"{systolic}/{diastolic}: {message}" if len(readings) > 1 else message)
+            conclusions.add(CONCLUSION_FOR.get(category))
+        if None in conclusions:
+            conclusions.discard('normal_case')  # one reading needs attention, so not "no immediate need"
+        conclusion = next((self.conclusions[name] for name in CONCLUSION_PRIORITY
+                           if name in conclusions and name in self.conclusions), None)
+        message = '\n\n'.join(messages)
+        return f"{message}\n\n{conclusion}" if conclusion else message
+
+    def handle(self, state, message):
+        state.pop('evaluated', None)  # sessions saved before readings were queued
+        pending = state.setdefault('pending', [])
+        pending.extend([systolic, diastolic] for systolic, diastolic in extract_readings(message))
+        filled = False
+        for slot, _ in self.slots:
+            parser = PARSERS.get(slot, parse_text)
+            # Only the question we just asked takes free-form answers;
+            # explicit statements ("I'm on medication", "150/95") are taken any time
+            asked = state['asked'] == slot
+            if slot in state['slots'] and not asked and slot != 'reading':
+                continue
+            if parser is parse_text and not asked:
+                continue
+            value = parser(message, asked)
+            if value is not None:
+                state['slots'][slot] = value
+                filled = True
+
+        on_treatment = state['slots'].get('on_treatment')
+        if pending and on_treatment is not None:
+            state['pending'] = []
+            state['asked'] = None
+            return self.evaluate(pending, on_treatment)
+
+        slot, question = self.next_question(state)
+        if not filled and not (state['asked'] is None and GREETING.match(message)):
+            # Not understood; the LLM answers and asks the next question itself
+            state['asked'] = slot
+            return None
+        state['asked'] = slot
+        if slot is None:
+            return "Thank you. You can share a new reading as SYS/DIA (e.g. 120/80) at any time."
+        if not state['slots'] and slot == self.slots[0][0]:
+            return f"{INTRO} {question}"
+        name = state['slots'].get('name')
+        if slot == 'age' and name:
+            return f"Nice to meet you, {name}. {question}"
+        return question
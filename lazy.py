@@ -0,0 +1,20 @@
+import threading
+from functools import wraps
+
+
+# Decorator for zero-argument factories: the value is built on first call
+# (once, even with concurrent callers) and reused afterwards.
+def lazy(factory):
+    lock = threading.Lock()
+    cache = []
+
+    @wraps(factory)
+    def get():
+        if not cache:
+            with lock:
+                if not cache:
+                    cache.append(factory())
+        return cache[0]
+
+    get.reset = cache.clear
+    return get
@@ -0,0 +1,77 @@
+import sys
+import threading
+from contextlib import contextmanager
+
+
+# Raised when an upstream (Groq, Google Sheets) already has as many calls in
+# flight as we allow and no slot frees up in time. Routes turn it into a 503.
+class UpstreamBusy(Exception):
+    def __init__(self, name, retry_after=1):
+        super().__init__(f"{name} is busy, please retry shortly")
+        self.name = name
+        self.retry_after = retry_after
+
+
+# Caps concurrent calls to one upstream so a burst of slow completions cannot
+# tie up every worker and connection.
+class UpstreamLimiter:
+    def __init__(self, name, max_concurrent, acquire_timeout=5.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.acquire_timeout = acquire_timeout
+        self.in_flight = 0
+        self.rejected = 0  # callers turned away with UpstreamBusy
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._count_lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            with self._count_lock:
+                self.rejected += 1
+            raise UpstreamBusy(self.name)
+        with self._count_lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._count_lock:
+                self.in_flight -= 1
+            self._semaphore.release()
+
+
+# Limiter that also hands out pooled connection objects (e.g. httplib2
+# clients, which must not be shared between concurrent requests). At most
+# `max_concurrent` connections are ever created; idle ones are reused.
+class ConnectionPool(UpstreamLimiter):
+    def __init__(self, name, factory, max_concurrent, acquire_timeout=5.0):
+        super().__init__(name, max_concurrent, acquire_timeout)
+        self.factory = factory
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with self.slot():
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self.factory()
+            try:
+                yield connection
+            finally:
+                with self._lock:
+                    self._idle.append(connection)
+
+
+# Run a blocking system call (fsync, a contended flock) without stalling the
+# worker. Under gevent's monkey patching every request is a greenlet on one
+# OS thread, so such calls go to the hub's native thread pool and only the
+# calling greenlet waits; otherwise the call is simply made.
+def run_blocking(func, *args):
+    if 'gevent' in sys.modules:
+        from gevent import get_hub, monkey
+
+        if monkey.is_module_patched('threading'):
+            return get_hub().threadpool.apply(func, args)
+    return func(*args)
@@ -0,0 +1,124 @@
+import gzip
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+MAX_PAGE_SIZE = 1000
+MAX_ANALYTICS_DAYS = 3650
+MAX_ROLLING_WINDOW = 100
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+GZIP_MIN_BYTES = 1024
+
+
+# Normalize a since/until query value to the sheet's timestamp format so it
+# can be compared directly with the stored strings. A bare date in `until`
+# covers the whole day.
+def parse_time_bound(value, end_of_day=False):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', ''))
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+
+# Read since/until/limit/cursor/format from the query string.
+# Raises ValueError with a readable message on bad input.
+def parse_log_query(args):
+    try:
+        since = parse_time_bound(args.get('since'))
+        until = parse_time_bound(args.get('until'), end_of_day=True)
+    except ValueError:
+        raise ValueError("since/until must be ISO dates, e.g. 2024-05-01 or 2024-05-01T08:30:00")
+    limit = args.get('limit')
+    cursor = args.get('cursor', '0')
+    if limit is not None and not (limit.isdigit() and 0 < int(limit) <= MAX_PAGE_SIZE):
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if not cursor.isdigit():
+        raise ValueError("cursor must be a value returned as next_cursor")
+    response_format = args.get('format', 'rows')
+    if response_format not in ('rows', 'columnar'):
+        raise ValueError("format must be 'rows' or 'columnar'")
+    return {
+        'since': since,
+        'until': until,
+        'limit': int(limit) if limit else None,
+        'cursor': int(cursor),
+        'format': response_format,
+    }
+
+
+def _bounded_int(args, name, default, maximum):
+    value = args.get(name)
+    if value is None:
+        return default
+    if not (value.isdigit() and 0 < int(value) <= maximum):
+        raise ValueError(f"{name} must be between 1 and {maximum}")
+    return int(value)
+
+
+# Read days/window/on_treatment for the analytics endpoints. The Logs sheet
+# does not record treatment status, so the caller says which rules apply.
+def parse_analytics_query(args):
+    on_treatment = args.get('on_treatment', 'false').lower()
+    if on_treatment not in TRUE_VALUES + FALSE_VALUES:
+        raise ValueError("on_treatment must be true or false")
+    return {
+        'days': _bounded_int(args, 'days', 30, MAX_ANALYTICS_DAYS),
+        'window': _bounded_int(args, 'window', 3, MAX_ROLLING_WINDOW),
+        'on_treatment': on_treatment in TRUE_VALUES,
+    }
+
+
+# Select one page of a patient's timeline. `timestamps` is sorted and aligned
+# with `rows`; the cursor is an offset into the since/until window.
+def page_rows(timestamps, rows, since=None, until=None, limit=None, cursor=0):
+    start = bisect_left(timestamps, since) if since else 0
+    stop = bisect_right(timestamps, until) if until else len(timestamps)
+    first = start + cursor
+    last = stop if limit is None else min(stop, first + limit)
+    next_cursor = str(last - start) if last < stop else None
+    return rows[first:last], next_cursor
+
+
+def _number(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+# Rows follow the Logs sheet schema: [timestamp, email, mac, systolic, diastolic]
+def rows_to_objects(rows):
+    return [{
+        'timestamp': row[0],
+        'email': row[1],
+        'mac_address': row[2],
+        'diastolic': row[4],
+        'systolic': row[3]
+    } for row in rows if len(row) >= 5]
+
+
+# Parallel arrays; email and MAC are constant for a patient so they are sent once
+def rows_to_columns(rows):
+    rows = [row for row in rows if len(row) >= 5]
+    return {
+        'email': rows[0][1] if rows else None,
+        'mac_address': rows[0][2] if rows else None,
+        'timestamps': [row[0] for row in rows],
+        'systolic': [_number(row[3]) for row in rows],
+        'diastolic': [_number(row[4]) for row in rows],
+    }
+
+
+# Serialize compactly and gzip when the client accepts it and it is worth it.
+# Returns (body, headers).
+def encode_json(payload, accept_encoding=''):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    headers = {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+    if 'gzip' in (accept_encoding or '') and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
@@ -0,0 +1,223 @@
+import cProfile
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond stages up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f'{self.name}{_labels(self.label_names, key)} {_number(value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, amount, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect_left(self.buckets, amount)] += 1
+            self._values[key] = (counts, total + amount)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = (('le', _number(bound)),)
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}')
+        lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_number(total)}')
+        lines.append(f'{self.name}_count{_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+# Values read from their owner at scrape time, e.g. a cache's hit counts or
+# the Sheets queue depth. `collect` returns a number, or a dict of
+# label value -> number for the single label.
+class Collected(_Metric):
+    def __init__(self, name, documentation, kind, collect, label=None):
+        super().__init__(name, documentation, (label,) if label else ())
+        self.kind = kind
+        self.collect = collect
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        try:
+            values = self.collect()
+        except Exception as error:
+            print(f"Metric {self.name} could not be collected:", error)
+            return lines
+        if not isinstance(values, dict):
+            values = {'': values} if self.label_names else {None: values}
+        for key, value in sorted(values.items(), key=lambda item: str(item[0])):
+            labels = _labels(self.label_names, (key,)) if self.label_names else ''
+            lines.append(f'{self.name}{labels} {_number(value)}')
+        return lines
+
+
+# Process-wide metrics in the Prometheus text format. Each gunicorn worker
+# keeps its own numbers, so scrape the workers individually (or run a single
+# gevent worker) to see totals.
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def collected(self, name, documentation, kind, collect, label=None):
+        return self._add(Collected(name, documentation, kind, collect, label))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+stage_seconds = REGISTRY.histogram(
+    'bp_pal_stage_seconds', 'Time spent in one stage of handling a request.', ('stage',))
+request_seconds = REGISTRY.histogram(
+    'bp_pal_request_seconds', 'Request latency by route, including streamed bodies.', ('route', 'method'))
+responses_total = REGISTRY.counter(
+    'bp_pal_responses_total', 'Responses by route and status code.', ('route', 'method', 'status'))
+groq_seconds = REGISTRY.histogram(
+    'bp_pal_groq_seconds', 'Groq completion latency, first request byte to last token.', ('mode',))
+groq_first_token_seconds = REGISTRY.histogram(
+    'bp_pal_groq_first_token_seconds', 'Time to the first streamed Groq token.')
+groq_tokens = REGISTRY.histogram(
+    'bp_pal_groq_tokens', 'Tokens per Groq completion.', ('kind',), TOKEN_BUCKETS)
+groq_tokens_total = REGISTRY.counter(
+    'bp_pal_groq_tokens_total', 'Tokens sent to and received from Groq.', ('kind',))
+groq_errors_total = REGISTRY.counter(
+    'bp_pal_groq_errors_total', 'Groq calls that raised.', ('error',))
+sheets_calls_total = REGISTRY.counter(
+    'bp_pal_sheets_calls_total', 'HTTP calls made to the Google Sheets API.', ('method', 'status'))
+sheets_bytes_total = REGISTRY.counter(
+    'bp_pal_sheets_bytes_total', 'Bytes exchanged with the Google Sheets API.', ('direction',))
+sheets_seconds = REGISTRY.histogram(
+    'bp_pal_sheets_seconds', 'Google Sheets API call latency.', ('method',))
+
+bulk_rows_total = REGISTRY.counter(
+    'bp_pal_bulk_rows_total', 'Rows received by /bp-logs/bulk, by outcome.', ('status',))
+
+
+# Time a block of work as one stage, e.g. `with span('markdown'):`
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+# Per-request cProfile sampling. Every `every`-th request is profiled and
+# the stats are dumped to `directory` for `python -m pstats` or snakeviz.
+# cProfile allows a single active profiler per process, so a request that
+# comes due while another is being profiled is skipped.
+class RequestProfiler:
+    def __init__(self, every=0, directory='profiles'):
+        self.every = every
+        self.directory = directory
+        self._count = 0
+        self._count_lock = threading.Lock()
+        self._active = threading.Lock()
+
+    def start(self):
+        if self.every <= 0:
+            return None
+        with self._count_lock:
+            self._count += 1
+            due = self._count % self.every == 0
+        if not due or not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler (e.g. a debugger) is already active
+            self._active.release()
+            return None
+        return profile
+
+    def stop(self, profile, name):
+        profile.disable()
+        self._active.release()
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_') or 'root'
+        path = os.path.join(self.directory, f'{safe_name}-{int(time.time() * 1000)}-{os.getpid()}.prof')
+        profile.dump_stats(path)
+        return path
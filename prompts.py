@@ -0,0 +1,30 @@
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    MessagesPlaceholder,
+    SystemMessagePromptTemplate,
+)
+
+# Compact prompt used alongside the intake state machine: the server tracks
+# what has been collected, so the model only sees a slot summary and the
+# latest messages instead of the full instructions and history.
+intake_system_prompt = (
+    "You are a helpful assistant guiding a hypertension assessment. "
+    "Reply to the user's last message briefly (under 300 characters), using only the details below, "
+    "and never evaluate blood pressure readings yourself. "
+    "End your reply with exactly one question: {next_question}\n"
+    "Known details: {slot_summary}"
+)
+
+# Build the chat prompt: compact system instructions, the session history, then the new user turn
+def build_intake_prompt(system_prompt=intake_system_prompt):
+    return ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate.from_template(system_prompt),
+            MessagesPlaceholder(variable_name="chat_history"),
+            HumanMessagePromptTemplate.from_template("{human_input}")
+        ]
+    )
+
+# Built once at import and shared by every request
+intake_prompt = build_intake_prompt()
@@ -0,0 +1,57 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+NON_WORD = re.compile(r'[^\w\s/]+')
+WHITESPACE = re.compile(r'\s+')
+
+
+# Lowercase, drop punctuation and collapse whitespace so "Hi!" and "hi" share a key
+def normalize_prompt(text):
+    return WHITESPACE.sub(' ', NON_WORD.sub(' ', (text or '').lower())).strip()
+
+
+# LRU cache of LLM answers keyed on (normalized prompt, hash of the recent
+# history window and any extra prompt context, model name). Only the last
+# `history_window` messages are part of the key, so identical scripted
+# exchanges from different sessions share an entry.
+class ResponseCache:
+    def __init__(self, max_entries=1024, history_window=2):
+        self.max_entries = max_entries
+        self.history_window = history_window
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, prompt, chat_history, model, context=''):
+        digest = hashlib.sha256(context.encode('utf-8'))
+        window = chat_history[-self.history_window:] if self.history_window else []
+        for message in window:
+            digest.update(message.type.encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(normalize_prompt(message.content).encode('utf-8'))
+            digest.update(b'\0')
+        return normalize_prompt(prompt), digest.hexdigest(), model
+
+    def get(self, key):
+        with self._lock:
+            response = self._entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key, response):
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
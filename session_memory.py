@@ -0,0 +1,177 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+from history_budget import TokenBudgetMemory
+from limits import run_blocking
+
+DEFAULT_TTL = 60 * 60  # seconds a session may stay idle before it is evicted
+DEFAULT_MAX_SESSIONS = 1000
+# Token limits for what one prompt may carry, see history_budget.TokenBudgetMemory
+DEFAULT_PROMPT_TOKENS = 1024
+DEFAULT_HISTORY_TOKENS = 384
+DEFAULT_SUMMARY_TOKENS = 128
+
+
+# One patient's conversation: its token-budgeted chat memory plus a small
+# free-form context dict for anything else we track per session.
+class Session:
+    def __init__(self, session_id, memory, context=None):
+        self.session_id = session_id
+        self.memory = memory
+        self.context = context or {}
+
+
+# In-process backend: an LRU ordered dict with idle-time expiry.
+# Only suitable for a single worker process.
+class InMemoryBackend:
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            updated, payload = entry
+            if time.time() - updated > self.ttl:
+                del self._data[session_id]
+                return None
+            self._data.move_to_end(session_id)
+            return payload
+
+    def put(self, session_id, payload):
+        with self._lock:
+            self._data[session_id] = (time.time(), payload)
+            self._data.move_to_end(session_id)
+            self._evict()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        while self._data:
+            oldest_id, (updated, _) = next(iter(self._data.items()))
+            if len(self._data) > self.max_sessions or updated < cutoff:
+                del self._data[oldest_id]
+            else:
+                break
+
+
+# SQLite backend shared by every worker on the same host. Payloads are stored
+# as JSON; WAL mode lets readers and the single writer run concurrently.
+class SqliteBackend:
+    def __init__(self, path, max_sessions=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        # One connection per process, shared under a lock. A threading.local
+        # connection would be per greenlet under gevent, i.e. a new connection
+        # and WAL setup on every request. Writes can wait on another worker's
+        # write lock, so they run through run_blocking; WAL reads never wait.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, payload TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, updated FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, session_id, payload):
+        with self._lock:
+            run_blocking(self._put, session_id, json.dumps(payload), time.time())
+
+    def _put(self, session_id, payload, now):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, payload, updated) VALUES (?, ?, ?)",
+                (session_id, payload, now),
+            )
+            self._conn.execute("DELETE FROM sessions WHERE updated < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                "SELECT id FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def delete(self, session_id):
+        with self._lock:
+            run_blocking(self._delete, session_id)
+
+    def _delete(self, session_id):
+        with self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+# Hands out a per-session token-budgeted memory and writes it back after the
+# turn. At most `window` exchanges (and `history_tokens` tokens) are kept
+# verbatim; older turns live on in the memory's summary, so every session is
+# bounded.
+class SessionStore:
+    def __init__(self, backend, window=20, prompt_tokens=DEFAULT_PROMPT_TOKENS,
+                 history_tokens=DEFAULT_HISTORY_TOKENS, summary_tokens=DEFAULT_SUMMARY_TOKENS):
+        self.backend = backend
+        self.window = window
+        self.prompt_tokens = prompt_tokens
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+
+    def load(self, session_id):
+        payload = self.backend.get(session_id) or {}
+        memory = TokenBudgetMemory(
+            budget=self.prompt_tokens, history_tokens=self.history_tokens, summary_tokens=self.summary_tokens,
+            max_messages=2 * self.window, state=payload.get('history'),
+        )
+        messages = payload.get('messages')
+        if messages:
+            memory.chat_memory.messages = messages_from_dict(messages)
+        return Session(session_id, memory, payload.get('context'))
+
+    def save(self, session):
+        session.memory.compact()
+        self.backend.put(session.session_id, {
+            'messages': messages_to_dict(session.memory.chat_memory.messages),
+            'history': session.memory.state,
+            'context': session.context,
+        })
+
+    def clear(self, session_id):
+        self.backend.delete(session_id)
+
+
+# Build the store from environment settings
+def create_session_store(window):
+    ttl = int(os.getenv("SESSION_TTL", DEFAULT_TTL))
+    max_sessions = int(os.getenv("SESSION_MAX", DEFAULT_MAX_SESSIONS))
+    if os.getenv("SESSION_BACKEND", "memory") == "sqlite":
+        backend = SqliteBackend(os.getenv("SESSION_DB", "sessions.db"), max_sessions, ttl)
+    else:
+        backend = InMemoryBackend(max_sessions, ttl)
+    return SessionStore(
+        backend, window,
+        prompt_tokens=int(os.getenv("PROMPT_TOKEN_BUDGET", DEFAULT_PROMPT_TOKENS)),
+        history_tokens=int(os.getenv("HISTORY_TOKEN_BUDGET", DEFAULT_HISTORY_TOKENS)),
+        summary_tokens=int(os.getenv("SUMMARY_TOKEN_BUDGET", DEFAULT_SUMMARY_TOKENS)),
+    )
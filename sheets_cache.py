@@ -0,0 +1,93 @@
+import threading
+import time
+from bisect import bisect_right
+
+
+# Read-through cache of the Logs sheet, indexed by patient key (the MAC
+# address column) and ordered by timestamp within each patient.
+#
+# The sheet is append-only in normal use, so a refresh only asks Sheets for
+# rows past the last row we already have. A full reload every
+# `full_refresh_interval` seconds picks up manual edits and deletions.
+class LogsReadCache:
+    def __init__(self, fetch_range, sheet_name, ttl=30.0, full_refresh_interval=900.0,
+                 key_column=2, timestamp_column=0):
+        self.fetch_range = fetch_range
+        self.sheet_name = sheet_name
+        self.ttl = ttl
+        self.full_refresh_interval = full_refresh_interval
+        self.key_column = key_column
+        self.timestamp_column = timestamp_column
+        self.hits = 0  # reads served without asking Sheets
+        self.misses = 0
+        self.rows_fetched = 0
+        self.generation = 0  # bumped on every full reload
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.header = []
+        self._row_count = 0  # rows seen in the sheet, header included
+        self._index = {}  # key -> ([timestamps], [rows]) kept in timestamp order
+        self._log = []  # the same rows in sheet order, for rows_since
+        self.generation += 1
+        self._fetched_at = 0.0
+        self._loaded_at = 0.0
+        self._stale = True
+
+    # Mark the cache out of date, e.g. after our own appends have landed
+    def invalidate(self):
+        self._stale = True
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._loaded_at >= self.full_refresh_interval:
+                self._reset()
+            elif not (force or self._stale or now - self._fetched_at >= self.ttl):
+                self.hits += 1
+                return
+            self.misses += 1
+            self._stale = False
+            start = self._row_count + 1
+            rows = self.fetch_range(f'{self.sheet_name}!A{start}:F')
+            self.rows_fetched += len(rows)
+            if start == 1:
+                self._loaded_at = now
+                if rows:
+                    self.header, rows = rows[0], rows[1:]
+                    self._row_count = 1
+            self._add(rows)
+            self._fetched_at = now
+
+    def _add(self, rows):
+        self._row_count += len(rows)
+        for row in rows:
+            if len(row) <= max(self.key_column, self.timestamp_column):
+                continue
+            self._log.append(row)
+            timestamps, entries = self._index.setdefault(row[self.key_column], ([], []))
+            timestamp = row[self.timestamp_column]
+            position = bisect_right(timestamps, timestamp)
+            timestamps.insert(position, timestamp)
+            entries.insert(position, row)
+
+    # Timestamps and rows for one patient, for range lookups with bisect
+    def timeline(self, mac_address, refresh=True):
+        if refresh:
+            self.refresh()
+        with self._lock:
+            timestamps, entries = self._index.get(mac_address, ([], []))
+            return list(timestamps), list(entries)
+
+    # Rows added after `cursor`, for consumers that keep their own copy (analytics).
+    # Returns (cursor, rows, reset); reset means the sheet was reloaded and
+    # the consumer should drop what it has before adding `rows`.
+    def rows_since(self, cursor=None, refresh=True):
+        if refresh:
+            self.refresh()
+        with self._lock:
+            generation, position = cursor or (None, 0)
+            reset = generation != self.generation
+            rows = self._log[0 if reset else position:]
+            return (self.generation, len(self._log)), rows, reset
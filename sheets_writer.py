@@ -0,0 +1,183 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from limits import run_blocking
+
+
+# Write-behind queue for Google Sheets appends.
+#
+# Rows are first appended to a local spool file (one JSON row per line) and
+# then flushed in batches by a background thread with a single append call.
+# The spool is only rewritten once Sheets has accepted a batch, so rows
+# survive a crash and are picked up again on the next start. Each process
+# owns its own spool file and holds a lock on it; spool files whose lock is
+# free belong to dead processes and are adopted at startup.
+class SheetsWriteBehind:
+    def __init__(self, append_rows, spool_dir, max_pending=5000, batch_size=200,
+                 flush_interval=1.0, max_backoff=60.0, on_flush=None):
+        self.append_rows = append_rows
+        self.on_flush = on_flush
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.rows_written = 0
+        self.failed_batches = 0
+        self._pending = []
+        self._closed = False
+        self._cond = threading.Condition()
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self.spool_path = os.path.join(spool_dir, f'sheets-{os.getpid()}.jsonl')
+        self._spool = None
+        orphans = self._adopt_orphans(spool_dir)
+        # Our spool only appears under its sheets-*.jsonl name once it is locked
+        self._rewrite_spool()
+        # Only drop the orphaned spools once their rows are safely in ours. A
+        # spool left by an earlier process with our pid was replaced in place.
+        for file, path in orphans:
+            if path != self.spool_path:
+                os.remove(path)
+            file.close()
+
+        self._thread = threading.Thread(target=self._run, name='sheets-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _read_spool(file):
+        file.seek(0)
+        rows = []
+        for line in file:
+            line = line.strip()
+            if line:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    pass  # torn last line from a crash mid-write
+        return rows
+
+    def _adopt_orphans(self, spool_dir):
+        orphans = []
+        for path in glob.glob(os.path.join(spool_dir, 'sheets-*.jsonl')):
+            try:
+                file = open(path, 'r')
+            except FileNotFoundError:
+                continue  # adopted and removed by another worker meanwhile
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                file.close()
+                continue  # still owned by a live worker
+            self._pending.extend(self._read_spool(file))
+            orphans.append((file, path))
+        return orphans
+
+    def _write_lines(self, rows):
+        self._spool.seek(0, os.SEEK_END)
+        self._spool.write(''.join(json.dumps(row) + '\n' for row in rows))
+        self._spool.flush()
+        run_blocking(os.fsync, self._spool.fileno())
+
+    def _rewrite_spool(self):
+        # Atomically replace the spool with the rows still pending. The
+        # temporary name does not match sheets-*.jsonl, so a worker starting
+        # up cannot adopt the file before it is locked.
+        directory = os.path.dirname(self.spool_path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.spool-', suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp:
+            tmp.write(''.join(json.dumps(row) + '\n' for row in self._pending))
+            tmp.flush()
+            run_blocking(os.fsync, tmp.fileno())
+        new_spool = open(tmp_path, 'a+')
+        fcntl.flock(new_spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(tmp_path, self.spool_path)
+        old_spool, self._spool = self._spool, new_spool
+        if old_spool is not None:
+            old_spool.close()
+
+    # Queue rows for the Logs sheet. Blocks up to `timeout` seconds while the
+    # queue is full and raises queue.Full if it stays full, or with `overflow`
+    # takes the rows past the limit anyway (a patient's own readings from
+    # chat, which must reach Sheets; bulk uploads get the backpressure).
+    def enqueue(self, rows, timeout=5.0, overflow=False):
+        rows = [list(row) for row in rows]
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Sheets writer is closed")
+            while len(self._pending) + len(rows) > self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if overflow:
+                        break
+                    raise queue.Full(f"{len(self._pending)} rows already waiting for Google Sheets")
+                self._cond.wait(remaining)
+            self._write_lines(rows)
+            self._pending.extend(rows)
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _run(self):
+        backoff = self.flush_interval
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch = self._pending[:self.batch_size]
+            try:
+                result = self.append_rows(batch)
+            except Exception as error:
+                print(f"Sheets append of {len(batch)} rows failed, retrying in {backoff:.0f}s:", error)
+                self.failed_batches += 1
+                retry_at = time.monotonic() + backoff
+                with self._cond:
+                    if self._closed:
+                        return  # rows stay in the spool for the next start
+                    while not self._closed and retry_at > time.monotonic():
+                        self._cond.wait(retry_at - time.monotonic())
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.flush_interval
+            with self._cond:
+                del self._pending[:len(batch)]
+                self.rows_written += len(batch)
+                self._rewrite_spool()
+                self._cond.notify_all()
+            print("Append result:", result)
+            if self.on_flush is not None:
+                self.on_flush(batch)
+
+    # Wait until everything queued so far has reached Sheets
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # Stop accepting rows and give the thread a last chance to flush on shutdown
+    def close(self, timeout=10.0):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._spool.close()
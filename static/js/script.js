@@ -6,25 +6,72 @@ function sendMessage() {
         displayUserMessage(user_input);
         document.getElementById('input').value = ''; // Clear the input field
 
-        // Fetch chatbot's response
-        fetch('/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({question: user_input})
-        }).then(response => response.json())
-          .then(data => {
-              displayBotMessage(data.answer);
-
-              // Check if FRT is recommended
-              if (data.frt_recommended === 1) {
-                  displayFRTButtons();
-              }
-          });
+        // Stream chatbot's response, falling back to the buffered endpoint
+        if (window.ReadableStream && window.TextDecoder) {
+            streamBotResponse(user_input);
+        } else {
+            fetch('/chat', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({question: user_input})
+            }).then(response => response.json())
+              .then(data => {
+                  displayBotMessage(data.answer);
+
+                  // Check if FRT is recommended
+                  if (data.frt_recommended === 1) {
+                      displayFRTButtons();
+                  }
+              });
+        }
     }
 }
 
+// Function to read the server-sent events from /chat/stream into one bot message
+function streamBotResponse(user_input) {
+    let botText = displayBotMessage('');
+    let chat = document.getElementById("chat");
+    let decoder = new TextDecoder();
+    let buffer = '';
+
+    fetch('/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify({question: user_input})
+    }).then(response => {
+        let reader = response.body.getReader();
+
+        function read() {
+            return reader.read().then(({done, value}) => {
+                if (done) {
+                    return;
+                }
+                buffer += decoder.decode(value, {stream: true});
+                // Events are separated by a blank line; keep any partial event for the next chunk
+                let events = buffer.split('\n\n');
+                buffer = events.pop();
+                events.forEach(event => {
+                    let data = event.split('\n')
+                        .filter(line => line.startsWith('data: '))
+                        .map(line => line.slice(6))
+                        .join('\n');
+                    if (data) {
+                        botText.innerHTML = JSON.parse(data).html;
+                        chat.scrollTop = chat.scrollHeight;
+                    }
+                });
+                return read();
+            });
+        }
+        return read();
+    }).catch(error => console.error('Error:', error));
+}
+
 // Function to display the FRT buttons
 function displayFRTButtons() {
     let buttonContainer = document.getElementById("button-container");
@@ -87,6 +134,7 @@ function displayBotMessage(message) {
     botMessage.appendChild(botText);
     chat.appendChild(botMessage);
     chat.scrollTop = chat.scrollHeight;
+    return botText;
 }
 
 // Add a click event listener to the button
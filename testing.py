@@ -16,6 +16,7 @@ from langchain.chains.conversation.memory import ConversationBufferWindowMemory
 from langchain_groq import ChatGroq
 import markdown
 from dotenv import load_dotenv
+from bp_rules import evaluate_reading, extract_readings
 
 load_dotenv()
 
@@ -85,6 +86,22 @@ system_prompt = (
 conversational_memory_length = 20  # number of previous messages the chatbot will remember during the conversation and
 memory = ConversationBufferWindowMemory(k=conversational_memory_length, memory_key="chat_history", return_messages=True)
 
+# Prompt and chain are built once; the rules are only stringified here, not per request
+prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessage(content=f"{system_prompt}\nEvaluation rules: {evaluation_rules}"),
+        MessagesPlaceholder(variable_name="chat_history"),
+        HumanMessagePromptTemplate.from_template("{human_input}")
+    ]
+)
+
+conversation = LLMChain(
+    llm=groq_chat,
+    prompt=prompt,
+    verbose=False,
+    memory=memory,
+)
+
 def get_mac_address():
     mac_num = hex(uuid.getnode()).replace('0x', '').upper()
     return ':'.join(mac_num[i:i+2] for i in range(0, len(mac_num), 2))
@@ -110,61 +127,16 @@ def chat():
             chat_context["on_treatment"] = "yes" in user_question.lower()
 
         if "bp" in user_question.lower() or "blood pressure" in user_question.lower() or "/" in user_question:
-            systolic, diastolic = None, None
-            parts = user_question.lower().split()
-            for part in parts:
-                if '/' in part:
-                    try:
-                        systolic, diastolic = map(int, part.split('/'))
-                        break
-                    except ValueError:
-                        pass
-            
-            if systolic and diastolic:
+            readings = extract_readings(user_question)
+            if readings:
+                systolic, diastolic = readings[0]
                 on_treatment = chat_context.get("on_treatment", False)
-                if on_treatment:
-                    print("on_treatment")
-                    if systolic >= 160 or diastolic >= 110:
-                        response = evaluation_rules["on_treatment"]["severe"]
-                    elif 150 <= systolic <= 159 or 100 <= diastolic <= 109:
-                        response = evaluation_rules["on_treatment"]["high"]
-                    elif 140 <= systolic <= 149 or 90 <= diastolic <= 99:
-                        response = evaluation_rules["on_treatment"]["raised"]
-                    elif 130 <= systolic <= 139 or 80 <= diastolic <= 89:
-                        response = evaluation_rules["on_treatment"]["high_normal"]
-                    elif 100 <= systolic <= 129 and diastolic < 80:
-                        response = evaluation_rules["on_treatment"]["low_normal"]
-                    else:
-                        response = evaluation_rules["on_treatment"]["low"]
-                else:
-                    print("not_on_treatment")
-                    # Determine the category
-                    if systolic >= 160 or diastolic >= 110:
-                        response = evaluation_rules["not_on_treatment"]["severe"]
-                    elif 140 <= systolic <= 159 or 90 <= diastolic <= 109:
-                        response = evaluation_rules["not_on_treatment"]["high"]
-                    else:
-                        response = evaluation_rules["not_on_treatment"]["normal"]
+                _, response = evaluate_reading(systolic, diastolic, on_treatment)
 
                 response_markdown = markdown.markdown(response)
                 return jsonify({"answer": response_markdown, "context": chat_context})
         else:
             # If no BP reading is provided, continue with the chat flow
-            prompt = ChatPromptTemplate.from_messages(
-                [
-                    SystemMessage(content=f"{system_prompt}\nEvaluation rules: {evaluation_rules}"),
-                    MessagesPlaceholder(variable_name="chat_history"),
-                    HumanMessagePromptTemplate.from_template("{human_input}")
-                ]
-            )
-
-            conversation = LLMChain(
-                llm=groq_chat,
-                prompt=prompt,
-                verbose=False,
-                memory=memory,
-            )
-
             response = conversation.predict(human_input=user_question)
             response_markdown = markdown.markdown(response)
             return jsonify({"answer": response_markdown, "context": chat_context})
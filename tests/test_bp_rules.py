@@ -0,0 +1,103 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bp_rules import (  # noqa: E402
+    classify_batch, compile_rule, evaluate_reading, extract_readings, parse_treatment_answer,
+)
+
+ON_TREATMENT = [
+    (200, 70, 'severe'),
+    (160, 70, 'severe'),
+    (120, 110, 'severe'),
+    (160, 110, 'severe'),
+    (159, 109, 'high'),
+    (150, 70, 'high'),
+    (120, 100, 'high'),
+    (149, 99, 'raised'),
+    (140, 60, 'raised'),
+    (120, 90, 'raised'),
+    (139, 89, 'high_normal'),
+    (130, 70, 'high_normal'),
+    (110, 80, 'high_normal'),
+    (129, 79, 'low_normal'),
+    (100, 60, 'low_normal'),
+    (99, 79, 'low'),
+    (90, 60, 'low'),
+]
+NOT_ON_TREATMENT = [
+    (160, 70, 'severe'),
+    (120, 110, 'severe'),
+    (160, 110, 'severe'),
+    (159, 109, 'high'),
+    (140, 90, 'high'),
+    (140, 60, 'high'),
+    (120, 90, 'high'),
+    (139, 89, 'normal'),
+    (129, 79, 'normal'),
+    (90, 60, 'normal'),
+]
+CASES = [(*case, True) for case in ON_TREATMENT] + [(*case, False) for case in NOT_ON_TREATMENT]
+
+
+@pytest.mark.parametrize('systolic, diastolic, category, on_treatment', CASES)
+def test_category_boundaries(systolic, diastolic, category, on_treatment):
+    assert evaluate_reading(systolic, diastolic, on_treatment)[0] == category
+
+
+def test_batch_agrees_with_scalar():
+    systolic = [systolic for systolic in range(60, 221, 3) for _ in range(40, 141, 3)]
+    diastolic = [diastolic for _ in range(60, 221, 3) for diastolic in range(40, 141, 3)]
+    for on_treatment in (False, True):
+        batch = classify_batch(systolic, diastolic, on_treatment)
+        assert list(batch) == [evaluate_reading(s, d, on_treatment)[0] for s, d in zip(systolic, diastolic)]
+    mixed = [index % 2 == 0 for index in range(len(systolic))]
+    batch = classify_batch(systolic, diastolic, mixed)
+    assert list(batch) == [evaluate_reading(s, d, t)[0] for s, d, t in zip(systolic, diastolic, mixed)]
+
+
+def test_compile_rule():
+    bounds, combinator, message = compile_rule(
+        "If SYS is 100-129 and DIA is less than 80, respond with: 'Your blood pressure is normal.'")
+    assert bounds == [('SYS', 100, 129), ('DIA', None, 79)]
+    assert combinator == 'and'
+    assert message == 'Your blood pressure is normal.'
+    with pytest.raises(ValueError):
+        compile_rule("If you feel unwell, respond with: 'See a doctor.'")
+
+
+@pytest.mark.parametrize('text, readings', [
+    ('bp 150/95', [(150, 95)]),
+    ('150 / 95', [(150, 95)]),
+    ('150/95 this morning and 120/80 now', [(150, 95), (120, 80)]),
+    ('measured on 10/12/2024', []),
+    ('on 12/10', []),
+    ('400/95', []),
+    ('150/20', []),
+    ('80/120', []),
+    ('1150/95', []),
+    ('', []),
+    (None, []),
+])
+def test_extract_readings(text, readings):
+    assert extract_readings(text) == readings
+
+
+@pytest.mark.parametrize('answer, on_treatment', [
+    ('yes', True),
+    ('I am taking labetalol', True),
+    ('I’m on meds', True),
+    ('no', False),
+    ("I'm not on medication", False),
+    ("I'm not taking any", False),
+    ('none', False),
+    ("I'm not sure", None),
+    ("I don't know", None),
+    ("yes, I'm not missing doses", None),
+    ('hello', None),
+])
+def test_parse_treatment_answer(answer, on_treatment):
+    assert parse_treatment_answer(answer) is on_treatment
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bp_store import BPLogStore  # noqa: E402
+
+
+def record(mac_address, systolic, timestamp):
+    return {'timestamp': timestamp, 'email': None, 'mac_address': mac_address,
+            'systolic': systolic, 'diastolic': 80}
+
+
+def line(mac_address, systolic, timestamp):
+    return json.dumps(record(mac_address, systolic, timestamp)).encode('utf-8') + b'\n'
+
+
+def test_append_seals_a_torn_line(tmp_path):
+    path = tmp_path / 'bp.jsonl'
+    path.write_bytes(line('a', 120, '2024-01-01 08:00:00') + b'{"timestamp": "2024-01-01 09:0')
+    store = BPLogStore(str(path))
+    store.append_many([record('a', 130, '2024-01-01 10:00:00')])
+    assert [reading['systolic'] for reading in store.get('a')] == [120, 130]
+    assert path.read_bytes().endswith(b'\n')
+    assert path.read_bytes().count(b'\n') == 3
+
+
+def test_partial_last_line_is_indexed_once_complete(tmp_path):
+    path = tmp_path / 'bp.jsonl'
+    complete = line('a', 140, '2024-01-02 08:00:00')
+    path.write_bytes(line('a', 120, '2024-01-01 08:00:00') + complete[:20])
+    store = BPLogStore(str(path))
+    assert [reading['systolic'] for reading in store.get('a')] == [120]
+    with open(path, 'ab') as file:
+        file.write(complete[20:])
+    assert [reading['systolic'] for reading in store.get('a')] == [120, 140]
+
+
+def test_foreign_lines_are_skipped(tmp_path):
+    path = tmp_path / 'bp.jsonl'
+    path.write_bytes(b'not json\n' + b'{"no": "fields"}\n' + line('a', 120, '2024-01-01 08:00:00'))
+    store = BPLogStore(str(path))
+    assert [reading['systolic'] for reading in store.get('a')] == [120]
+    _, rows, _ = store.rows_since()
+    assert [row[3] for row in rows] == [120]
+
+
+def test_other_process_rebuilds_its_index_after_compact(tmp_path):
+    path = str(tmp_path / 'bp.jsonl')
+    writer, reader = BPLogStore(path), BPLogStore(path)
+    writer.append_many([record('b', 150, '2024-01-01 08:00:00'), record('a', 120, '2024-01-01 09:00:00'),
+                        record('b', 155, '2024-01-02 08:00:00'), record('a', 125, '2024-01-02 09:00:00')])
+    with open(path, 'ab') as file:
+        file.write(b'{"torn":')  # dropped by compact
+    cursor, rows, _ = reader.rows_since()
+    assert len(rows) == 4
+    assert [reading['systolic'] for reading in reader.get('b')] == [150, 155]
+    inode = os.stat(path).st_ino
+
+    assert writer.compact() == 4
+    assert os.stat(path).st_ino != inode
+    assert [reading['systolic'] for reading in reader.get('a')] == [120, 125]
+    assert [reading['systolic'] for reading in reader.get('b')] == [150, 155]
+    _, rows, reset = reader.rows_since(cursor)
+    assert reset and len(rows) == 4
+
+
+def test_migrates_the_legacy_json_store_once(tmp_path):
+    legacy = tmp_path / 'bp_logs.json'
+    legacy.write_text(json.dumps({
+        'a': [{'systolic': 120, 'diastolic': 80, 'timestamp': '2024-01-01 08:00:00'}],
+        'b': [{'systolic': 150, 'diastolic': 95, 'timestamp': '2024-01-01 09:00:00', 'email': 'b@example.com'}],
+    }))
+    path = str(tmp_path / 'bp.jsonl')
+    store = BPLogStore(path, legacy_path=str(legacy))
+    assert store.get('a') == [{'systolic': 120, 'diastolic': 80, 'timestamp': '2024-01-01 08:00:00'}]
+    assert store.timeline('b')[1] == [['2024-01-01 09:00:00', 'b@example.com', 'b', 150, 95]]
+
+    store.append_many([record('a', 130, '2024-01-02 08:00:00')])
+    BPLogStore(path, legacy_path=str(legacy))  # the existing store is not overwritten
+    assert len(BPLogStore(path).get('a')) == 2
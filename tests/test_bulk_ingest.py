@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_ingest import ingest, validate_record  # noqa: E402
+
+DEVICE = 'aa:bb:cc:dd:ee:ff'
+
+
+@pytest.mark.parametrize('mac_address', [None, '', DEVICE])
+def test_rows_are_stored_for_this_device(mac_address):
+    record = {'timestamp': '2024-05-01T08:30:00', 'systolic': '150', 'diastolic': '95', 'mac_address': mac_address}
+    stored, on_treatment = validate_record(record, DEVICE, False)
+    assert stored['mac_address'] == DEVICE
+    assert (stored['systolic'], stored['diastolic'], on_treatment) == (150, 95, False)
+
+
+def test_rows_for_another_device_are_rejected():
+    written = []
+    records = [(2, {'systolic': '150', 'diastolic': '95', 'mac_address': '11:22:33:44:55:66'}),
+               (3, {'systolic': '120', 'diastolic': '80'})]
+    results = list(ingest(iter(records), written.extend, DEVICE))
+    assert results[0]['status'] == 'error' and 'mac_address' in results[0]['error']
+    assert results[1]['status'] == 'ok'
+    assert results[-1]['summary']['accepted'] == 1
+    assert [record['mac_address'] for record in written] == [DEVICE]
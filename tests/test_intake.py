@@ -0,0 +1,113 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bp_rules import evaluate_reading  # noqa: E402
+from intake import IntakeFlow, parse_gender, parse_name  # noqa: E402
+
+SEVERE_ADVICE = evaluate_reading(165, 112, True)[1]
+HIGH_ADVICE = evaluate_reading(150, 95, False)[1]
+LOW_ADVICE = evaluate_reading(90, 60, True)[1]
+
+
+@pytest.fixture
+def flow():
+    return IntakeFlow.from_file()
+
+
+def run(flow, state, *messages):
+    return [flow.handle(state, message) for message in messages]
+
+
+def answered_until_reading(flow):
+    state = flow.new_state()
+    run(flow, state, 'hi', 'My name is Ann', '34', 'female', 'married')
+    assert flow.next_question(state)[0] == 'reading'
+    return state
+
+
+def test_repeated_severe_reading_gets_the_guidance_again(flow):
+    state = answered_until_reading(flow)
+    first, treatment, repeat = run(flow, state, '165/112', 'yes', '165/112')
+    assert first == dict(flow.slots)['on_treatment']
+    assert SEVERE_ADVICE in treatment
+    assert SEVERE_ADVICE in repeat
+    assert flow.conclusions['severe_case'] in repeat
+
+
+def test_every_reading_in_a_message_is_evaluated(flow):
+    state = answered_until_reading(flow)
+    run(flow, state, '120/80', 'no')
+    reply = flow.handle(state, 'first 150/95 then 120/80')
+    assert f"150/95: {HIGH_ADVICE}" in reply
+    assert "120/80: " in reply
+    assert reply.endswith(flow.conclusions['further_evaluation'])
+    assert state['slots']['reading'] == [120, 80]
+
+
+def test_reading_waits_for_a_clear_treatment_answer(flow):
+    state = answered_until_reading(flow)
+    assert SEVERE_ADVICE not in flow.handle(state, '165/112')
+    assert flow.handle(state, "I'm not sure") is None
+    assert 'on_treatment' not in state['slots']
+    assert SEVERE_ADVICE in flow.handle(state, 'yes')
+    assert state['pending'] == []
+
+
+@pytest.mark.parametrize('answer, gender', [
+    ("I'm non-binary", 'other'),
+    ("I'm other", 'other'),
+    ("I'm a woman", 'female'),
+    ('f', 'female'),
+    ('M', 'male'),
+    ('male', 'male'),
+])
+def test_parse_gender(answer, gender):
+    assert parse_gender(answer, True) == gender
+
+
+def test_low_reading_on_treatment_gets_no_normal_conclusion(flow):
+    state = answered_until_reading(flow)
+    run(flow, state, '90/60')
+    reply = flow.handle(state, 'yes')
+    assert reply == LOW_ADVICE
+    assert flow.conclusions['normal_case'] not in reply
+    reply = flow.handle(state, '90/60 and later 120/70')
+    assert LOW_ADVICE in reply
+    assert flow.conclusions['normal_case'] not in reply
+
+
+def test_normal_reading_gets_the_normal_conclusion(flow):
+    state = answered_until_reading(flow)
+    reply = run(flow, state, '120/70', 'no')[-1]
+    assert reply.endswith(flow.conclusions['normal_case'])
+
+
+@pytest.mark.parametrize('message', [
+    'I am on medication',
+    "Hi, I'm worried about my blood pressure",
+    "I'm not sure what to do",
+])
+def test_statements_after_the_greeting_are_not_names(flow, message):
+    state = flow.new_state()
+    flow.handle(state, 'hi')
+    flow.handle(state, message)
+    assert 'name' not in state['slots']
+    assert flow.next_question(state)[0] == 'name'
+
+
+@pytest.mark.parametrize('message, asked, name', [
+    ('My name is Ann', False, 'Ann'),
+    ('call me jo', False, 'Jo'),
+    ("I'm Ann", True, 'Ann'),
+    ("I'm Ann Smith and I'm worried", True, 'Ann Smith'),
+    ('Ann', True, 'Ann'),
+    ("I'm Ann", False, None),
+    ('I am on medication', False, None),
+    ('on medication', True, None),
+])
+def test_parse_name(message, asked, name):
+    assert parse_name(message, asked) == name
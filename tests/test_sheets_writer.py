@@ -0,0 +1,66 @@
+import fcntl
+import json
+import os
+import queue
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sheets_writer import SheetsWriteBehind  # noqa: E402
+
+
+def unavailable(rows):
+    raise RuntimeError("Sheets is down")
+
+
+def write_spool(path, rows):
+    with open(path, 'w') as file:
+        file.write(''.join(json.dumps(row) + '\n' for row in rows))
+
+
+@pytest.fixture
+def writers():
+    created = []
+
+    def create(spool_dir, **options):
+        created.append(SheetsWriteBehind(unavailable, spool_dir, flush_interval=60, **options))
+        return created[-1]
+
+    yield create
+    for writer in created:
+        writer.close()
+
+
+def test_spool_is_locked_under_its_final_name(tmp_path, writers):
+    writer = writers(str(tmp_path))
+    assert os.listdir(tmp_path) == [os.path.basename(writer.spool_path)]
+    with open(writer.spool_path, 'r') as other:
+        with pytest.raises(OSError):
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_dead_spools_are_adopted_and_live_ones_left_alone(tmp_path, writers):
+    write_spool(tmp_path / 'sheets-1.jsonl', [['dead', 1]])
+    write_spool(tmp_path / f'sheets-{os.getpid()}.jsonl', [['same pid', 2]])
+    write_spool(tmp_path / 'sheets-2.jsonl', [['live', 3]])
+    with open(tmp_path / 'sheets-2.jsonl', 'r') as live:
+        fcntl.flock(live, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        writer = writers(str(tmp_path))
+        assert sorted(os.listdir(tmp_path)) == ['sheets-2.jsonl', os.path.basename(writer.spool_path)]
+    assert writer.pending() == 2
+    with open(writer.spool_path, 'r') as spool:
+        assert sorted(json.loads(line) for line in spool) == [['dead', 1], ['same pid', 2]]
+    writer.enqueue([['new', 4]])
+    with open(writer.spool_path, 'r') as spool:
+        assert json.loads(spool.readlines()[-1]) == ['new', 4]
+
+
+def test_full_queue_rejects_unless_overflow(tmp_path, writers):
+    writer = writers(str(tmp_path), max_pending=1)
+    writer.enqueue([['first', 1]])
+    with pytest.raises(queue.Full):
+        writer.enqueue([['bulk', 2]], timeout=0)
+    writer.enqueue([['chat', 3]], timeout=0, overflow=True)
+    assert writer.pending() == 2